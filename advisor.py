@@ -0,0 +1,131 @@
+'''index advisor: EXPLAIN every route's queries and flag sequential scans
+
+    flask explain-routes --threshold 10000
+
+Each GET route (and the two search forms) is requested through the test
+client while the SQL it issues is captured. Every captured SELECT is then
+run through EXPLAIN, and full-table scans of tables larger than the
+threshold are reported.
+'''
+import json
+import re
+import sys
+import click
+from sqlalchemy import event, func, inspect, text
+from sqlalchemy.engine import Engine
+from app import app, db, page_cache
+from models import Venue, Artist
+
+# "SCAN venues", "SCAN TABLE venues AS v", "SCAN v USING INDEX ix_..."
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(.*)$')
+ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)"?\s+AS\s+"?(\w+)"?', re.I)
+SEARCH_FORMS = [
+    ('search_venues', '/venues/search'),
+    ('search_artists', '/artists/search'),
+]
+
+
+def route_requests():
+    '''(endpoint, method, url, form) for every route without side effects'''
+    sample_ids = {
+        'venue_id': db.session.query(func.min(Venue.id)).scalar(),
+        'artist_id': db.session.query(func.min(Artist.id)).scalar(),
+    }
+    for rule in app.url_map.iter_rules():
+        if 'GET' not in rule.methods or rule.endpoint == 'static':
+            continue
+        if any(sample_ids.get(arg) is None for arg in rule.arguments):
+            continue
+        url = rule.build({arg: sample_ids[arg] for arg in rule.arguments},
+                         append_unknown=False)[1]
+        yield rule.endpoint, 'GET', url, None
+    for endpoint, url in SEARCH_FORMS:
+        yield endpoint, 'POST', url, {'search_term': 'a'}
+
+
+def capture_statements():
+    '''maps each endpoint to the SELECT statements it executes'''
+    captured = {}
+    current = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters,
+                              context, executemany):
+        if current and statement.lstrip().upper().startswith('SELECT'):
+            captured.setdefault(current[0], {})[statement] = parameters
+
+    event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        client = app.test_client()
+        for endpoint, method, url, form in list(route_requests()):
+            current[:] = [endpoint]
+            page_cache.clear()
+            client.open(url, method=method, data=form)
+            current[:] = []
+    finally:
+        event.remove(Engine, 'before_cursor_execute', before_cursor_execute)
+    return captured
+
+
+def table_rows(connection, table):
+    if connection.dialect.name == 'postgresql':
+        return connection.execute(
+            text('SELECT reltuples::bigint FROM pg_class WHERE relname = :t'),
+            {'t': table}).scalar() or 0
+    return connection.execute(text('SELECT count(*) FROM "%s"' % table)) \
+        .scalar()
+
+
+def sequential_scans(connection, statement, parameters):
+    '''tables scanned in full by the plan for statement'''
+    if connection.dialect.name == 'postgresql':
+        plan = connection.exec_driver_sql(
+            'EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', []))
+            if node['Node Type'] == 'Seq Scan':
+                yield node['Relation Name']
+        return
+    # SQLite names aliased tables by their alias in the plan
+    aliases = {alias: table for table, alias in ALIAS.findall(statement)}
+    tables = set(inspect(connection).get_table_names())
+    for row in connection.exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + statement, parameters):
+        match = SQLITE_SCAN.match(row[-1])
+        # SCAN ... USING [COVERING] INDEX reads an index, not the table
+        if not match or re.search(r'\bUSING\b.*\bINDEX\b', match.group(2)):
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        # CONSTANT ROW, subqueries and CTEs are not tables
+        if table in tables:
+            yield table
+
+
+@app.cli.command('explain-routes')
+@click.option('--threshold', default=10000, show_default=True,
+              help='Only flag scans of tables with more rows than this.')
+def explain_routes_command(threshold):
+    '''EXPLAIN the queries behind every route and flag sequential scans.'''
+    flagged = 0
+    sizes = {}
+    captured = capture_statements()
+    with db.engine.connect() as connection:
+        for endpoint in sorted(captured):
+            for statement, parameters in captured[endpoint].items():
+                for table in set(sequential_scans(connection, statement,
+                                                  parameters)):
+                    if table not in sizes:
+                        sizes[table] = table_rows(connection, table)
+                    if sizes[table] <= threshold:
+                        continue
+                    flagged += 1
+                    click.echo('%s: sequential scan of %s (%d rows)\n    %s'
+                               % (endpoint, table, sizes[table],
+                                  ' '.join(statement.split())[:200]))
+    click.echo('%d sequential scan(s) over %d rows in %d route(s)'
+               % (flagged, threshold, len(captured)))
+    if flagged:
+        sys.exit(1)
@@ -0,0 +1,218 @@
+'''versioned JSON API over venues, artists and shows
+
+Detail and search endpoints return JSON documents. List endpoints stream
+newline-delimited JSON straight from a server-side cursor, so memory use
+does not grow with the size of the result.
+'''
+import datetime as dt
+import json
+from flask import Blueprint, Response, current_app, request
+from flask import stream_with_context
+from sqlalchemy.exc import DBAPIError
+from app import db, page_cache, genre_filter, parse_date, calendar_filters
+from forms import occurrences
+from models import Show
+from schedule import find_conflicts, is_overlap_error
+from search import venue_search, artist_search, catalog_search
+import importer
+import queries
+
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+
+def to_json(value):
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    raise TypeError('%r is not JSON serializable' % (value,))
+
+
+def json_response(data, status=200):
+    return Response(json.dumps(data, default=to_json), status=status,
+                    mimetype='application/json')
+
+
+def ndjson_response(rows):
+    def generate():
+        for row in rows:
+            yield json.dumps(row, default=to_json) + '\n'
+    return Response(stream_with_context(generate()),
+                    mimetype='application/x-ndjson')
+
+
+def not_found():
+    return json_response({"error": "not found"}, 404)
+
+
+@api.errorhandler(400)
+def bad_request(error):
+    return json_response({"error": "bad request"}, 400)
+
+
+def genre_arg():
+    genre = request.args.get('genre')
+    return genre_filter(genre) if genre else None
+
+
+def search_term():
+    return request.args.get('q', '').strip()
+
+
+@api.route('/search')
+def search():
+    '''venues and artists ranked by how well ?q= matches them'''
+    limit = min(request.args.get('limit', current_app.config['SEARCH_RESULTS'],
+                                 type=int),
+                current_app.config['SEARCH_MAX_RESULTS'])
+    return json_response(queries.catalog_results(
+        db.session, catalog_search.search(search_term(), max(limit, 1))))
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+def list_venues():
+    '''every venue, as NDJSON'''
+    return ndjson_response(queries.iter_venues(db.session, genre_arg()))
+
+
+@api.route('/venues/search')
+def search_venues():
+    '''venues whose name contains ?q='''
+    return json_response(
+        queries.search_results(db.session, 'venue',
+                               venue_search.search(search_term())))
+
+
+@api.route('/venues/<int:venue_id>')
+def get_venue(venue_id):
+    '''venue with its past and upcoming shows'''
+    data = queries.venue_detail(db.session, venue_id)
+    return json_response(data) if data else not_found()
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@api.route('/artists')
+def list_artists():
+    '''every artist, as NDJSON'''
+    return ndjson_response(queries.iter_artists(db.session, genre_arg()))
+
+
+@api.route('/artists/search')
+def search_artists():
+    '''artists whose name contains ?q='''
+    return json_response(
+        queries.search_results(db.session, 'artist',
+                               artist_search.search(search_term())))
+
+
+@api.route('/artists/<int:artist_id>')
+def get_artist(artist_id):
+    '''artist with their past and upcoming shows'''
+    data = queries.artist_detail(db.session, artist_id)
+    return json_response(data) if data else not_found()
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api.route('/shows')
+def list_shows():
+    '''every show in the optional ?from=&to= range, as NDJSON'''
+    return ndjson_response(queries.iter_shows(
+        db.session, parse_date(request.args.get('from')),
+        parse_date(request.args.get('to'))))
+
+
+@api.route('/shows/calendar')
+def show_calendar():
+    '''shows by day between ?from= and ?to=, optionally in ?city= or ?state='''
+    filters = calendar_filters(request.args, current_app.config)
+    days = queries.show_calendar(db.session, filters['from'], filters['to'],
+                                 city=filters['city'], state=filters['state'])
+    return json_response({"days": days})
+
+
+@api.route('/shows/bulk', methods=['POST'])
+def create_shows():
+    '''creates a JSON array of shows in one transaction
+
+    Each show has venue_id, artist_id, an ISO start_time and optionally
+    duration_minutes and an iCalendar recurrence rule. Nothing is written
+    unless every show is valid and free of double bookings; the errors are
+    keyed by array index.
+    '''
+    config = current_app.config
+    shows = request.get_json(silent=True)
+    if not isinstance(shows, list) or \
+            not all(isinstance(show, dict) for show in shows):
+        return json_response({"error": "expected a JSON array of shows"},
+                             400)
+    limit = config['SHOW_BULK_MAX_ROWS']
+    if len(shows) > limit:
+        return json_response({"error": "more than %d shows" % limit}, 413)
+    validate = importer.ShowValidator(db.session, shows)
+    rows = []
+    origins = []
+    errors = {}
+    for index, show in enumerate(shows):
+        values, row_errors = validate(show)
+        if row_errors:
+            errors[index] = row_errors
+            continue
+        try:
+            times = occurrences(values['start_time'], show.get('recurrence'),
+                                config['SHOW_MAX_OCCURRENCES'],
+                                config['SHOW_MAX_RECURRENCE_DAYS'])
+        except ValueError as ex:
+            errors[index] = {"recurrence": [str(ex)]}
+            continue
+        rows.extend(dict(values, start_time=start_time)
+                    for start_time in times)
+        origins.extend([index] * len(times))
+    if errors:
+        return json_response({"error": "invalid shows", "errors": errors},
+                             400)
+    if len(rows) > limit:
+        return json_response({"error": "more than %d shows" % limit}, 413)
+    conflicts = find_conflicts(db.session, rows, [
+        'show #%d at %s' % (index, row['start_time'].isoformat(' '))
+        for index, row in zip(origins, rows)])
+    if conflicts:
+        for position, row_errors in conflicts.items():
+            for name, messages in row_errors.items():
+                errors.setdefault(origins[position], {}) \
+                    .setdefault(name, []).extend(messages)
+        return json_response({"error": "overlapping shows",
+                              "errors": errors}, 409)
+    try:
+        importer.insert_batch('shows', Show.__table__,
+                              importer.SHOW_COLUMNS, rows)
+    except DBAPIError as ex:
+        db.session.rollback()
+        if not is_overlap_error(ex):
+            raise
+        # booked concurrently since the check above
+        return json_response({"error": "overlapping shows"}, 409)
+    page_cache.clear()
+    return json_response({"created": len(rows)}, 201)
+
+
+@api.route('/shows/search')
+def search_shows():
+    '''upcoming shows at venues or by artists whose name contains ?q='''
+    term = search_term()
+    if not term:
+        return json_response({"count": 0, "data": []})
+    venue_ids = [match.id for match in venue_search.search(term)]
+    artist_ids = [match.id for match in artist_search.search(term)]
+    shows = queries.search_shows(db.session, venue_ids, artist_ids)
+    return json_response({"count": len(shows), "data": shows})
+
+
+@api.route('/shows/<int:show_id>')
+def get_show(show_id):
+    data = queries.show_detail(db.session, show_id)
+    return json_response(data) if data else not_found()
@@ -3,26 +3,32 @@
 # ----------------------------------------------------------------------------#
 
 import json
+import base64
 from operator import concat, le
 import sys
 import logging
 from logging import Formatter, FileHandler
 import datetime as dt
+from functools import lru_cache
 import dateutil.parser
 import babel
+import babel.dates
 from flask import (
   Flask,
   render_template,
   request, Response,
   flash, redirect,
-  url_for
+  url_for, abort
   )
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import desc
 from flask_wtf import Form
 from flask_migrate import Migrate
 from forms import *
+import cache
+from cache import cached_page, conditional_page
+import metrics
+import assets
+from routing import RoutingSQLAlchemy
 
 
 # ----------------------------------------------------------------------------#
@@ -32,141 +38,137 @@ from forms import *
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
+page_cache = cache.from_config(app.config)
+metrics.init_app(app, page_cache)
+assets.init_app(app)
 
 # ----------------------------------------------------------------------------#
 # Models.
 # ----------------------------------------------------------------------------#
 
 from models import *
+import queries
+from search import venue_search, artist_search, catalog_search
+import summaries
+from schedule import find_conflicts, is_overlap_error
 
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def datetime_pattern(format, locale):
+    '''compiled Babel pattern and locale for a (format, locale) pair'''
+    pattern = DATETIME_FORMATS.get(format, format)
+    return babel.dates.parse_pattern(pattern), babel.Locale.parse(locale)
+
+
+def format_datetime(value, format='medium', locale='en'):
+    '''formats a datetime (or a date string) with a cached Babel pattern'''
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    pattern, locale = datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.add_extension(cache.FragmentCache)
+app.jinja_env.fragment_cache = cache.from_config(app.config,
+                                                 'FRAGMENT_CACHE_')
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 
+def genre_filter(genre):
+    '''validates the ?genre= argument of the listing pages'''
+    name = genre_name(genre)
+    if name is None:
+        abort(400)
+    return name
+
+
+def catalog_version(**view_args):
+    '''ETag and Last-Modified of the listing pages'''
+    venues, artists, changed = queries.catalog_version(db.session)
+    return 'catalog-%d-%d-%s' % (venues, artists, changed.isoformat()), \
+        changed
+
+
+def entity_version(model, column):
+    '''ETag and Last-Modified of a venue or artist page'''
+    def version(**view_args):
+        entity_id, = view_args.values()
+        changed = queries.entity_version(db.session, model, column, entity_id)
+        if changed is None:
+            return None
+        return '%s-%d-%s' % (model.__tablename__, entity_id,
+                             changed.isoformat()), changed
+    return version
+
+
 @app.route('/')
+@conditional_page(catalog_version)
+@cached_page(page_cache)
 def index():
     '''renders app home page'''
-    venues = Venue.query.order_by(desc(Venue.created_date)).limit(10).all()
-    artists = Artist.query.order_by(desc(Artist.created_date)).limit(10).all()
+    venues = queries.latest(db.session, Venue)
+    artists = queries.latest(db.session, Artist)
     return render_template('pages/home.html', venues=venues, artists=artists)
 
 
+@app.route('/search')
+def search():
+    '''ranks venues and artists together by name, city, state and genres'''
+    search_term = request.args.get('q', '')
+    limit = min(request.args.get('limit', app.config['SEARCH_RESULTS'],
+                                 type=int), app.config['SEARCH_MAX_RESULTS'])
+    response = queries.catalog_results(
+        db.session, catalog_search.search(search_term, max(limit, 1)))
+    return render_template('pages/search.html', results=response,
+                           search_term=search_term)
+
+
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@conditional_page(catalog_version)
+@cached_page(page_cache)
 def venues():
     '''renders venue by city and state'''
-    venues = Venue.query.group_by(Venue.id, Venue.state, Venue.city).all()
-    time = dt.datetime.now()
-    data = []
-    city_state = ''
-
-    for venue in venues:
-        num_upcoming_shows = venue.shows.filter(Show.start_time > time).count()
-        if city_state == venue.city+venue.state:
-            data[-1]['venues'].append({
-              "id": venue.id,
-              "name": venue.name,
-              "num_upcoming_shows": num_upcoming_shows
-            })
-        else:
-            city_state = venue.city + venue.state
-            data.append({
-              "city": venue.city,
-              "state": venue.state,
-              "venues": [{
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": num_upcoming_shows
-                }]
-            })
+    genre = request.args.get('genre')
+    data = queries.venue_areas(db.session,
+                               genre=genre_filter(genre) if genre else None)
     return render_template('pages/venues.html', areas=data)
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
     '''search for venues using partial string matching'''
-    search_term = request.form.get('search_term')
-    venues = Venue.query.filter(Venue.name.ilike('%'+search_term+'%'))
-    response = {
-      "count": venues.count(),
-      "data": []
-    }
-    for venue in venues:
-        details = {
-          "id": venue.id,
-          "name": venue.name,
-          "num_upcoming_shows": 0
-        }
-        response['data'].append(details)
-    return render_template('pages/search_venues.html', results=response, 
-                           search_term=request.form.get('search_term', ''))
+    search_term = request.form.get('search_term', '')
+    response = queries.search_results(db.session, 'venue',
+                                      venue_search.search(search_term))
+    return render_template('pages/search_venues.html', results=response,
+                           search_term=search_term)
 
 
 @app.route('/venues/<int:venue_id>')
+@conditional_page(entity_version(Venue, Show.venue_id))
 def show_venue(venue_id):
     '''renders venue with the venue id'''
-    venue = Venue.query.get(venue_id)
-    if venue:
-        today = dt.datetime.now()
-        past_shows_query = db.session.query(Show).join(Venue).filter(Show.venue_id == venue_id).filter(Show.start_time < today).all()
-        past_shows = []
-        upcoming_shows_query = db.session.query(Show).join(Venue).filter(Show.venue_id == venue_id).filter(Show.start_time > today).all()
-        upcoming_shows = []
-
-        for show in past_shows_query:
-            past_shows.append({
-              "artist_id": show.artist_id,
-              "artist_name": show.artist.name,
-              "artist_image_link": show.artist.image_link,
-              "start_time": show.start_time.strftime('%A %Y-%B-%-dT%H:%m:%S')
-            })
-
-        for show in upcoming_shows_query:
-            upcoming_shows.append({
-              "artist_id": show.artist_id,
-              "artist_name": show.artist.name,
-              "artist_image_link": show.artist.image_link,
-              "start_time": show.start_time.strftime("%A %Y-%B-%-dT%H:%m:%S")    
-            })
-
-        data = {
-            "id": venue.id,
-            "name": venue.name,
-            "genres": venue.genres,
-            "city": venue.city,
-            "state": venue.state,
-            "phone": venue.phone,
-            "seeking_talent": venue.seeking_talent,
-            "seeking_description": venue.seeking_description,
-            "website": venue.website_link,
-            "facebook_link": venue.facebook_link,
-            "image_link": venue.image_link,
-            "past_shows": past_shows,
-            "upcoming_shows": upcoming_shows_query,
-            "past_shows_count": len(past_shows),
-            "upcoming_shows_count": len(upcoming_shows)
-        }
+    data = queries.venue_detail(db.session, venue_id)
+    if data:
         return render_template('pages/show_venue.html', venue=data)
     return render_template('errors/404.html')
 
@@ -190,6 +192,7 @@ def create_venue_submission():
         form.populate_obj(venue)
         db.session.add(venue)
         db.session.commit()
+        page_cache.clear()
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except Exception as ex:
         db.session.rollback()
@@ -208,6 +211,7 @@ def delete_venue(venue_id):
         venue = Venue.query.get(venue_id)
         db.session.delete(venue)
         db.session.commit()
+        page_cache.clear()
         db.session.close()
         flash('Venue was successfully Deleted!')
         return render_template('pages/home.html')
@@ -241,6 +245,7 @@ def edit_venue_submission(venue_id):
             flash('Venue ' + request.form['name'] +
                   ' was successfully edited!')
             db.session.commit()
+            page_cache.clear()
             return redirect(url_for('show_venue', venue_id=venue_id))
         except Exception as ex:
             db.session.rollback()
@@ -255,77 +260,33 @@ def edit_venue_submission(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@conditional_page(catalog_version)
+@cached_page(page_cache)
 def artists():
     '''renders list of artists'''
-    data = Artist.query.with_entities(Artist.id, Artist.name).all()
+    genre = request.args.get('genre')
+    data = queries.artist_list(db.session,
+                               genre=genre_filter(genre) if genre else None)
     return render_template('pages/artists.html', artists=data)
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
     '''search for artist using partial string matching'''
-    search_term = request.form.get('search_term')
-    artists = Artist.query.filter(Artist.name.ilike('%'+search_term+'%'))
-    response = {
-      "count": artists.count(),
-      "data": []
-    }
-    for artist in artists:
-        details = {
-          "id": artist.id,
-          "name": artist.name,
-          "num_upcoming_shows": 0
-        }
-        response['data'].append(details)
+    search_term = request.form.get('search_term', '')
+    response = queries.search_results(db.session, 'artist',
+                                      artist_search.search(search_term))
     return render_template('pages/search_artists.html', results=response,
-                           search_term=request.form.get('search_term', ''))
+                           search_term=search_term)
 
 
 @app.route('/artists/<int:artist_id>')
+@conditional_page(entity_version(Artist, Show.artist_id))
 def show_artist(artist_id):
     '''renders artist page using the artist id'''
-    artist = Artist.query.get(artist_id)
-    if artist:
-        today = dt.datetime.now()
-        past_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id == artist_id).filter(Show.start_time<today).all()
-        past_shows = []
-        upcoming_shows_query = db.session.query(Show).join(Venue).filter(Show.artist_id==artist_id).filter(Show.start_time>today).all()
-        upcoming_shows = []
-
-        for show in past_shows_query:
-            past_shows.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "venue_image_link": show.venue.image_link,
-            "start_time": show.start_time.strftime('%A %Y-%B-%-dT%H:%m:%S.000Z')
-            })
-
-        for show in upcoming_shows_query:
-            upcoming_shows.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "venue_image_link": show.venue.image_link,
-            "start_time": show.start_time.strftime('%A %Y-%B-%-dT%H:%m:%S.000Z')    
-            })
-
-        data = {
-          "id": artist.id,
-          "name": artist.name,
-          "genres": artist.genres,
-          "city": artist.city,
-          "state": artist.state,
-          "phone": artist.phone,
-          "seeking_venue": artist.seeking_venue,
-          "seeking_description":artist.seeking_description,
-          "website":artist.website_link,
-          "facebook_link":artist.facebook_link,
-          "image_link":artist.image_link,
-          "past_shows": past_shows,
-          "upcoming_shows": upcoming_shows,
-          "past_shows_count": len(past_shows),
-          "upcoming_shows_count": len(upcoming_shows),
-        }
-        return render_template('pages/show_artist.html', artist=data)    
+    data = queries.artist_detail(db.session, artist_id)
+    if data:
+        return render_template('pages/show_artist.html', artist=data)
     return render_template('errors/404.html')
 
 
@@ -351,6 +312,7 @@ def edit_artist_submission(artist_id):
             form = ArtistForm(formdata=request.form, obj=artist)
             form.populate_obj(artist)
             db.session.commit()
+            page_cache.clear()
             flash('Artist ' + request.form['name'] +
                   ' was successfully edited!')
             return redirect(url_for('show_artist', artist_id=artist_id))
@@ -383,6 +345,7 @@ def create_artist_submission():
         form.populate_obj(artist)
         db.session.add(artist)
         db.session.commit()
+        page_cache.clear()
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except Exception as ex:
         db.session.rollback()
@@ -397,22 +360,100 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
+def encode_cursor(show):
+    '''encodes the (start_time, id) keyset position of a show'''
+    position = show['start_time'].isoformat() + '|' + str(show['id'])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    '''decodes a cursor into its (start_time, id) keyset position'''
+    try:
+        position = base64.urlsafe_b64decode(cursor.encode()).decode()
+        start_time, show_id = position.split('|')
+        return dt.datetime.fromisoformat(start_time), int(show_id)
+    except ValueError:
+        abort(400)
+
+
+def parse_date(value):
+    '''parses an optional YYYY-MM-DD query string argument'''
+    if not value:
+        return None
+    try:
+        return dt.datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        abort(400)
+
+
 @app.route('/shows')
+@conditional_page(catalog_version)
+@cached_page(page_cache)
 def shows():
-    '''displays list of shows at /shows'''
-    data = []
-    shows = Show.query.order_by('venue_id', 'start_time').all()
-    for show in shows:
-        details = {
-          "venue_id": show.venue_id,
-          "venue_name": show.venue.name,
-          "artist_id": show.artist_id,
-          "artist_name": show.artist.name,
-          "artist_image_link": show.artist.image_link,
-          "start_time": show.start_time.strftime('%A %Y-%B-%-dT%H:%m:%S.000Z')
-        }
-        data.append(details)
-    return render_template('pages/shows.html', shows=data)
+    '''displays a page of shows at /shows, ordered by start time'''
+    per_page = min(request.args.get('per_page', app.config['SHOWS_PER_PAGE'],
+                                    type=int), app.config['SHOWS_MAX_PER_PAGE'])
+    per_page = max(per_page, 1)
+    date_from = parse_date(request.args.get('from'))
+    date_to = parse_date(request.args.get('to'))
+    after = request.args.get('after')
+    before = request.args.get('before')
+    data, has_next, has_prev = queries.show_page(
+        db.session, per_page, date_from, date_to,
+        after=decode_cursor(after) if after else None,
+        before=decode_cursor(before) if before else None)
+
+    filters = {
+      "per_page": per_page,
+      "from": request.args.get('from'),
+      "to": request.args.get('to')
+    }
+    next_url = prev_url = None
+    if data and has_next:
+        next_url = url_for('shows', after=encode_cursor(data[-1]), **filters)
+    if data and has_prev:
+        prev_url = url_for('shows', before=encode_cursor(data[0]), **filters)
+    return render_template('pages/shows.html', shows=data, filters=filters,
+                           next_url=next_url, prev_url=prev_url)
+
+
+def calendar_filters(args, config):
+    '''validated from, to, city and state arguments of the show calendar'''
+    date_from = parse_date(args.get('from')) or \
+        dt.datetime.combine(dt.date.today(), dt.time())
+    date_to = parse_date(args.get('to')) or \
+        date_from + dt.timedelta(days=config['CALENDAR_DAYS'] - 1)
+    if date_to < date_from or \
+            (date_to - date_from).days >= config['CALENDAR_MAX_DAYS']:
+        abort(400)
+    return {
+      "from": date_from,
+      "to": date_to,
+      "city": args.get('city', '').strip() or None,
+      "state": args.get('state', '').strip().upper() or None
+    }
+
+
+def calendar_version(**view_args):
+    '''catalog_version plus the dates shown, which without ?from= move on
+    at midnight'''
+    filters = calendar_filters(request.args, app.config)
+    etag, changed = catalog_version()
+    if not request.args.get('from'):
+        changed = max(changed, filters['from'])
+    return '%s-%s-%s' % (etag, filters['from'].date().isoformat(),
+                         filters['to'].date().isoformat()), changed
+
+
+@app.route('/shows/calendar')
+@conditional_page(calendar_version)
+@cached_page(page_cache)
+def show_calendar():
+    '''shows by day between two dates, optionally in one city or state'''
+    filters = calendar_filters(request.args, app.config)
+    days = queries.show_calendar(db.session, filters['from'], filters['to'],
+                                 city=filters['city'], state=filters['state'])
+    return render_template('pages/calendar.html', days=days, filters=filters)
 
 
 @app.route('/shows/create')
@@ -426,14 +467,37 @@ def create_shows():
 def create_show_submission():
     '''creates new shows in the db, upon submitting new show listing form'''
     form = ShowForm(request.form)
+    # the same checks as the importer, including that both ids exist
+    show, errors = importer.ShowValidator(db.session, [request.form])(
+        request.form)
     try:
-        show = Show()
-        form.populate_obj(show)
-        db.session.add(show)
-        db.session.commit()
-        flash('Show was successfully listed!')
+        if errors:
+            raise ValueError(' '.join(
+                '%s: %s' % (name, message)
+                for name, messages in errors.items() for message in messages))
+        times = occurrences(show['start_time'], form.recurrence.data,
+                            app.config['SHOW_MAX_OCCURRENCES'],
+                            app.config['SHOW_MAX_RECURRENCE_DAYS'])
+    except ValueError as ex:
+        flash('Show could not be listed. %s' % ex)
+        return render_template('forms/new_show.html', form=form)
+    # a residency is one bulk insert and one commit, not one per date
+    shows = [dict(show, start_time=start_time) for start_time in times]
+    if find_conflicts(db.session, shows):
+        # the venue or the artist is already booked then
+        abort(409)
+    try:
+        importer.insert_batch('shows', Show.__table__,
+                              importer.SHOW_COLUMNS, shows)
+        page_cache.clear()
+        if len(times) > 1:
+            flash('%d shows were successfully listed!' % len(times))
+        else:
+            flash('Show was successfully listed!')
     except Exception as ex:
         db.session.rollback()
+        if is_overlap_error(ex):
+            abort(409)
         print(sys.exc_info(ex))
         flash('An error occurred. Show could not be listed.')
     finally:
@@ -441,6 +505,12 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+@app.errorhandler(400)
+def bad_request_error(error):
+    '''error handler'''
+    return render_template('errors/400.html'), 400
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     '''error handler'''
@@ -493,6 +563,29 @@ if not app.debug:
     app.logger.addHandler(file_handler)
     app.logger.info('errors')
 
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+
+import advisor
+import importer
+import datagen
+import partitions
+
+# ----------------------------------------------------------------------------#
+# API.
+# ----------------------------------------------------------------------------#
+
+from api import api
+app.register_blueprint(api)
+
+# ----------------------------------------------------------------------------#
+# Images.
+# ----------------------------------------------------------------------------#
+
+import images
+images.init_app(app)
+
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
@@ -0,0 +1,143 @@
+'''content-hashed, precompressed static assets
+
+    flask build-assets
+
+copies every file under static/ to static/dist/ with a content hash in its
+name, next to .gz and .br variants wherever compression pays off, and
+writes static/dist/manifest.json. Templates call static_url('css/main.css'),
+which resolves through the manifest to /assets/css/main.<hash>.css. That
+URL is served with far-future immutable caching, using the precompressed
+variant the client accepts. Without a build, static_url falls back to the
+plain /static URL.
+
+Brotli output needs the optional ``brotli`` package.
+'''
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import click
+from flask import Blueprint, abort, current_app, request, send_from_directory
+from flask import url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+assets = Blueprint('assets', __name__, url_prefix='/assets')
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+# already compressed formats gain nothing from gzip or brotli
+PRECOMPRESSED_TYPES = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.woff',
+                       '.woff2', '.gz', '.br')
+ONE_YEAR = 365 * 24 * 60 * 60
+
+
+def hashed_name(path, content):
+    root, ext = os.path.splitext(path)
+    return '%s.%s%s' % (root, hashlib.sha256(content).hexdigest()[:12], ext)
+
+
+def write_variant(path, content, compress):
+    '''writes a compressed copy only when it is smaller than the original'''
+    compressed = compress(content)
+    if len(compressed) < len(content):
+        with open(path, 'wb') as target:
+            target.write(compressed)
+
+
+def build(static_dir):
+    '''fingerprints and precompresses static_dir, returning the manifest'''
+    dist_dir = os.path.join(static_dir, DIST)
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [name for name in dirs
+                   if os.path.join(root, name) != dist_dir]
+        for name in files:
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_dir) \
+                .replace(os.sep, '/')
+            with open(source, 'rb') as original:
+                content = original.read()
+            hashed = hashed_name(relative, content)
+            target = os.path.join(dist_dir, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as copy:
+                copy.write(content)
+            if not name.lower().endswith(PRECOMPRESSED_TYPES):
+                write_variant(target + '.gz', content,
+                              lambda data: gzip.compress(data, 9, mtime=0))
+                if brotli is not None:
+                    write_variant(target + '.br', content, brotli.compress)
+            manifest[relative] = hashed
+    with open(os.path.join(dist_dir, MANIFEST), 'w') as target:
+        json.dump(manifest, target, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(app):
+    '''the build manifest, re-read whenever the build changes it'''
+    path = os.path.join(app.static_folder, DIST, MANIFEST)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    cached = app.extensions.get('assets_manifest')
+    if cached is None or cached[0] != mtime:
+        with open(path) as source:
+            cached = (mtime, json.load(source))
+        app.extensions['assets_manifest'] = cached
+    return cached[1]
+
+
+def static_url(filename):
+    '''URL of a static file, fingerprinted when a build exists'''
+    hashed = load_manifest(current_app).get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('assets.asset', filename=hashed)
+
+
+@assets.route('/<path:filename>')
+def asset(filename):
+    '''serves a fingerprinted file, precompressed when the client allows'''
+    dist_dir = os.path.join(current_app.static_folder, DIST)
+    if filename == MANIFEST or \
+            not os.path.isfile(os.path.join(dist_dir, filename)):
+        abort(404)
+    accepted = request.accept_encodings
+    served, encoding = filename, None
+    for suffix, name in (('.br', 'br'), ('.gz', 'gzip')):
+        if accepted[name] and \
+                os.path.isfile(os.path.join(dist_dir, filename + suffix)):
+            served, encoding = filename + suffix, name
+            break
+    response = send_from_directory(
+        dist_dir, served,
+        mimetype=mimetypes.guess_type(filename)[0] or
+        'application/octet-stream',
+        max_age=ONE_YEAR)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = \
+        'public, max-age=%d, immutable' % ONE_YEAR
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    app.register_blueprint(assets)
+    app.add_template_global(static_url)
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        '''Fingerprint and precompress everything under static/.'''
+        manifest = build(app.static_folder)
+        click.echo('%d assets written to %s'
+                   % (len(manifest), os.path.join(app.static_folder, DIST)))
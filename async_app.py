@@ -0,0 +1,231 @@
+'''asyncio read path for the public pages
+
+    hypercorn async_app:app
+
+A Quart app serving the read-only pages (home, listings, venue and artist
+pages and the searches) on SQLAlchemy's asyncio engine: asyncpg on
+PostgreSQL, aiosqlite on SQLite. A single worker overlaps many database waits instead
+of blocking on each. Page data comes from the same queries.py functions and
+models.py mappings as the sync app, run on an AsyncSession through
+run_sync(), and is rendered with the same templates.
+
+Forms, writes, the JSON API, /img and /assets stay on the sync app; run
+both behind a proxy that sends the routes below here.
+'''
+from quart import Quart, render_template, request, url_for
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from app import (
+  format_datetime, genre_filter, parse_date, encode_cursor, decode_cursor,
+  calendar_filters
+  )
+from models import Venue, Artist
+from search import venue_search, artist_search, catalog_search
+import assets
+import cache
+import images
+import queries
+
+app = Quart(__name__)
+app.config.from_object('config')
+app.jinja_env.filters['datetime'] = format_datetime
+app.jinja_env.add_extension(cache.FragmentCache)
+app.jinja_env.fragment_cache = cache.from_config(app.config,
+                                                 'FRAGMENT_CACHE_')
+
+ASYNC_DRIVERS = {
+  "postgresql": 'postgresql+asyncpg',
+  "postgres": 'postgresql+asyncpg',
+  "sqlite": 'sqlite+aiosqlite'
+}
+
+Session = sessionmaker(class_=AsyncSession, expire_on_commit=False)
+
+
+def async_database_uri(uri):
+    '''the asyncio driver URL for a sync SQLAlchemy URL'''
+    scheme, rest = uri.split('://', 1)
+    return '%s://%s' % (ASYNC_DRIVERS.get(scheme.split('+')[0], scheme),
+                        rest)
+
+
+@app.before_serving
+async def connect():
+    uri = app.config.get('ASYNC_DATABASE_URI') or \
+        async_database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    Session.configure(bind=create_async_engine(uri))
+
+
+@app.after_serving
+async def disconnect():
+    await Session.kw['bind'].dispose()
+
+
+async def read(function, *args, **kwargs):
+    '''runs a sync function(session, ...) on a new AsyncSession'''
+    async with Session() as session:
+        return await session.run_sync(function, *args, **kwargs)
+
+
+@app.template_global()
+def static_url(filename):
+    '''assets.static_url, with fingerprinted files served by the sync app'''
+    hashed = assets.load_manifest(app).get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return '%s/%s' % (assets.assets.url_prefix, hashed)
+
+
+@app.template_global()
+def image_url(kind, entity_id, size='tile'):
+    '''images.image_url, served by the sync app'''
+    return '%s/%s/%d/%s' % (images.images.url_prefix, kind, entity_id, size)
+
+
+# ----------------------------------------------------------------------------#
+# Controllers.
+# ----------------------------------------------------------------------------#
+
+def home_page(session):
+    return queries.latest(session, Venue), queries.latest(session, Artist)
+
+
+@app.route('/')
+async def index():
+    '''renders app home page'''
+    venues, artists = await read(home_page)
+    return await render_template('pages/home.html', venues=venues,
+                                 artists=artists)
+
+
+def catalog_page(session, search_term, limit):
+    return queries.catalog_results(
+        session, catalog_search.search(search_term, limit, session=session))
+
+
+@app.route('/search')
+async def search():
+    '''ranks venues and artists together by name, city, state and genres'''
+    search_term = request.args.get('q', '')
+    limit = min(request.args.get('limit', app.config['SEARCH_RESULTS'],
+                                 type=int), app.config['SEARCH_MAX_RESULTS'])
+    response = await read(catalog_page, search_term, max(limit, 1))
+    return await render_template('pages/search.html', results=response,
+                                 search_term=search_term)
+
+
+@app.route('/venues')
+async def venues():
+    '''renders venue by city and state'''
+    genre = request.args.get('genre')
+    data = await read(queries.venue_areas,
+                      genre=genre_filter(genre) if genre else None)
+    return await render_template('pages/venues.html', areas=data)
+
+
+def search_page(session, kind, service, search_term):
+    return queries.search_results(
+        session, kind, service.search(search_term, session=session))
+
+
+@app.route('/venues/search', methods=['POST'])
+async def search_venues():
+    '''search for venues using partial string matching'''
+    search_term = (await request.form).get('search_term', '')
+    response = await read(search_page, 'venue', venue_search, search_term)
+    return await render_template('pages/search_venues.html',
+                                 results=response, search_term=search_term)
+
+
+@app.route('/venues/<int:venue_id>')
+async def show_venue(venue_id):
+    '''renders venue with the venue id'''
+    data = await read(queries.venue_detail, venue_id)
+    if data:
+        return await render_template('pages/show_venue.html', venue=data)
+    return await render_template('errors/404.html')
+
+
+@app.route('/artists')
+async def artists():
+    '''renders list of artists'''
+    genre = request.args.get('genre')
+    data = await read(queries.artist_list,
+                      genre=genre_filter(genre) if genre else None)
+    return await render_template('pages/artists.html', artists=data)
+
+
+@app.route('/artists/search', methods=['POST'])
+async def search_artists():
+    '''search for artist using partial string matching'''
+    search_term = (await request.form).get('search_term', '')
+    response = await read(search_page, 'artist', artist_search, search_term)
+    return await render_template('pages/search_artists.html',
+                                 results=response, search_term=search_term)
+
+
+@app.route('/artists/<int:artist_id>')
+async def show_artist(artist_id):
+    '''renders artist page using the artist id'''
+    data = await read(queries.artist_detail, artist_id)
+    if data:
+        return await render_template('pages/show_artist.html', artist=data)
+    return await render_template('errors/404.html')
+
+
+@app.route('/shows')
+async def shows():
+    '''displays a page of shows at /shows, ordered by start time'''
+    per_page = min(request.args.get('per_page', app.config['SHOWS_PER_PAGE'],
+                                    type=int), app.config['SHOWS_MAX_PER_PAGE'])
+    per_page = max(per_page, 1)
+    after = request.args.get('after')
+    before = request.args.get('before')
+    data, has_next, has_prev = await read(
+        queries.show_page, per_page,
+        parse_date(request.args.get('from')),
+        parse_date(request.args.get('to')),
+        after=decode_cursor(after) if after else None,
+        before=decode_cursor(before) if before else None)
+
+    filters = {
+      "per_page": per_page,
+      "from": request.args.get('from'),
+      "to": request.args.get('to')
+    }
+    next_url = prev_url = None
+    if data and has_next:
+        next_url = url_for('shows', after=encode_cursor(data[-1]), **filters)
+    if data and has_prev:
+        prev_url = url_for('shows', before=encode_cursor(data[0]), **filters)
+    return await render_template('pages/shows.html', shows=data,
+                                 filters=filters, next_url=next_url,
+                                 prev_url=prev_url)
+
+
+@app.route('/shows/calendar')
+async def show_calendar():
+    '''shows by day between two dates, optionally in one city or state'''
+    filters = calendar_filters(request.args, app.config)
+    days = await read(queries.show_calendar, filters['from'], filters['to'],
+                      city=filters['city'], state=filters['state'])
+    return await render_template('pages/calendar.html', days=days,
+                                 filters=filters)
+
+
+@app.errorhandler(400)
+async def bad_request_error(error):
+    '''error handler'''
+    return await render_template('errors/400.html'), 400
+
+
+@app.errorhandler(404)
+async def not_found_error(error):
+    '''error handler'''
+    return await render_template('errors/404.html'), 404
+
+
+@app.errorhandler(500)
+async def server_error(error):
+    '''error handler'''
+    return await render_template('errors/500.html'), 500
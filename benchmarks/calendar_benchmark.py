@@ -0,0 +1,96 @@
+'''shows that /shows/calendar latency does not grow with show history
+
+    python benchmarks/calendar_benchmark.py --history 10000 100000 1000000
+
+For each history size the database is reseeded with that many past shows
+(spread over --past-days) plus the same --upcoming shows in the next
+--future-days, so every run returns the same calendar rows. The calendar
+for the coming --days is then requested --requests times through the test
+client with the page cache cleared; p50/p95 should stay flat while the
+history grows by orders of magnitude.
+'''
+import argparse
+import datetime as dt
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import seed  # noqa: E402
+from app import app, page_cache  # noqa: E402
+from datagen import generate  # noqa: E402
+
+
+def statements(response):
+    for timing in response.headers.getlist('Server-Timing'):
+        match = re.search(r'desc="(\d+) queries"', timing)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def measure(urls, requests):
+    client = app.test_client()
+    timings = []
+    for number in range(requests):
+        page_cache.clear()
+        started = time.perf_counter()
+        response = client.get(urls[number % len(urls)])
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError('%s returned %d' % (urls[number % len(urls)],
+                                                   response.status_code))
+    ordered = sorted(timings)
+    return {
+      "p50_ms": statistics.median(ordered),
+      "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+      "queries": statements(response),
+      "tiles": response.data.count(b'tile-show')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--history', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--upcoming', type=int, default=5000)
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--past-days', type=int, default=3650)
+    parser.add_argument('--future-days', type=int, default=60)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--database-url',
+                        default='sqlite:////tmp/fyyur_calendar_benchmark.db')
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['SQL_METRICS'] = True
+    today = dt.date.today()
+    date_from = today + dt.timedelta(days=1)
+    date_to = date_from + dt.timedelta(days=args.days - 1)
+    window = 'from=%s&to=%s' % (date_from, date_to)
+    urls = ['/shows/calendar?' + window,
+            '/shows/calendar?state=NY&' + window,
+            '/shows/calendar?city=Chicago&state=IL&' + window]
+
+    print('%10s %9s %9s %8s %7s' % ('history', 'p50 ms', 'p95 ms',
+                                    'queries', 'tiles'))
+    with app.app_context():
+        for history in args.history:
+            seed(args.venues, args.artists, 0)
+            generate(0, 0, history, upcoming_ratio=0,
+                     past_days=args.past_days, rng_seed=history)
+            generate(0, 0, args.upcoming, upcoming_ratio=1,
+                     future_days=args.future_days, rng_seed=0)
+            result = measure(urls, args.requests)
+            print('%10d %9.2f %9.2f %8s %7d'
+                  % (history, result['p50_ms'], result['p95_ms'],
+                     result['queries'], result['tiles']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+'''compares concurrent throughput of the sync app and the asyncio read path
+
+    python benchmarks/concurrency_benchmark.py --concurrency 1 8 32 64 \
+        --database-url postgresql://localhost/fyyur_bench
+
+Seeds the database once, then serves it from one single-threaded sync
+worker (werkzeug, like one sync gunicorn worker; --sync-threaded lets it
+spawn a thread per request) and from one async_app worker under hypercorn.
+At each concurrency level --requests GETs over the read-only routes are
+issued by that many client threads, and throughput and p50/p95 latency are
+reported. The async path only pays off when the worker actually waits on
+the database, so point --database-url at PostgreSQL for meaningful numbers.
+'''
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def serve_sync(database_url, port, threaded):
+    import logging
+    from werkzeug.serving import make_server
+    import config
+    # the async path has no page cache, so compare without one
+    config.PAGE_CACHE_BACKEND = None
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQL_METRICS'] = False
+    make_server('127.0.0.1', port, app, threaded=threaded).serve_forever()
+
+
+def serve_async(database_url, port):
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    from async_app import app
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    config = Config()
+    config.bind = ['127.0.0.1:%d' % port]
+    config.accesslog = config.errorlog = None
+    asyncio.run(serve(app, config))
+
+
+def wait_until_up(base, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(base + '/', timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('%s did not start' % base)
+
+
+def paths(venues, artists, count, rng):
+    '''a random mix of the read-only pages'''
+    choices = [
+        lambda: '/',
+        lambda: '/venues',
+        lambda: '/artists',
+        lambda: '/shows',
+        lambda: '/venues/%d' % rng.randint(1, venues),
+        lambda: '/artists/%d' % rng.randint(1, artists),
+    ]
+    return [rng.choice(choices)() for _ in range(count)]
+
+
+def fetch(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=60) as response:
+        response.read()
+    return (time.perf_counter() - started) * 1000
+
+
+def load(base, urls, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        timings = list(pool.map(fetch, [base + url for url in urls]))
+    elapsed = time.perf_counter() - started
+    ordered = sorted(timings)
+    return {
+      "requests_per_s": len(urls) / elapsed,
+      "p50_ms": statistics.median(ordered),
+      "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 8, 32, 64])
+    parser.add_argument('--sync-threaded', action='store_true',
+                        help='let the sync server use a thread per request')
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--database-url',
+                        default='sqlite:////tmp/fyyur_concurrency_benchmark.db')
+    args = parser.parse_args()
+
+    from dataset import seed
+    from app import app
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    with app.app_context():
+        seed(args.venues, args.artists, args.shows)
+
+    context = multiprocessing.get_context('spawn')
+    servers = [
+        ('sync', context.Process(target=serve_sync, args=(
+            args.database_url, args.port, args.sync_threaded))),
+        ('async', context.Process(target=serve_async, args=(
+            args.database_url, args.port + 1))),
+    ]
+    print('%-6s %12s %10s %9s %9s' % ('app', 'concurrency', 'req/s',
+                                      'p50 ms', 'p95 ms'))
+    for offset, (name, process) in enumerate(servers):
+        base = 'http://127.0.0.1:%d' % (args.port + offset)
+        process.start()
+        try:
+            wait_until_up(base)
+            for concurrency in args.concurrency:
+                urls = paths(args.venues, args.artists, args.requests,
+                             random.Random(concurrency))
+                result = load(base, urls, concurrency)
+                print('%-6s %12d %10.1f %9.2f %9.2f'
+                      % (name, concurrency, result['requests_per_s'],
+                         result['p50_ms'], result['p95_ms']))
+        finally:
+            process.terminate()
+            process.join()
+
+
+if __name__ == '__main__':
+    main()
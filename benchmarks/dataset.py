@@ -0,0 +1,16 @@
+'''synthetic venues, artists and shows for the benchmarks'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import db  # noqa: E402
+from datagen import generate  # noqa: E402
+
+
+def seed(venues, artists, shows, batch_size=50000, rng_seed=0, **options):
+    '''recreates the schema and fills it with the given volumes'''
+    db.drop_all()
+    db.create_all()
+    generate(venues, artists, shows, batch_size, rng_seed=rng_seed,
+             **options)
@@ -0,0 +1,54 @@
+'''per-tile cost of formatting a show's start_time
+
+    python benchmarks/datetime_benchmark.py --tiles 100000
+
+"before" is the original pipeline: strftime in the view, then the filter
+re-parsing that string with dateutil and handing it to
+babel.dates.format_datetime. "after" is the current filter applied to the
+datetime the view now passes through.
+'''
+import argparse
+import datetime as dt
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates  # noqa: E402
+import dateutil.parser  # noqa: E402
+from app import format_datetime  # noqa: E402
+
+
+def before(start_time, format='full'):
+    value = start_time.strftime('%A %Y-%B-%-dT%H:%m:%S.000Z')
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format, locale='en')
+
+
+def after(start_time, format='full'):
+    return format_datetime(start_time, format)
+
+
+def per_tile_us(pipeline, start_times):
+    started = time.perf_counter()
+    for start_time in start_times:
+        pipeline(start_time)
+    return (time.perf_counter() - started) / len(start_times) * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tiles', type=int, default=100000)
+    args = parser.parse_args()
+    first = dt.datetime(2026, 1, 1, 20, 0)
+    start_times = [first + dt.timedelta(minutes=37 * i)
+                   for i in range(args.tiles)]
+    old = per_tile_us(before, start_times)
+    new = per_tile_us(after, start_times)
+    print('before: %8.2f us/tile' % old)
+    print('after:  %8.2f us/tile (%.1fx faster)' % (new, old / new))
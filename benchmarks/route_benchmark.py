@@ -0,0 +1,180 @@
+'''times every route in app.py against a seeded database
+
+    python benchmarks/route_benchmark.py --venues 1000 --artists 2000 \
+        --shows 100000 --output results.json [--compare previous.json]
+
+Each route is requested through the Flask test client. p50/p95 latency and
+the statement count (from the Server-Timing header) come from --requests
+timed runs; peak Python memory comes from one extra run under tracemalloc.
+The page cache is cleared before every request unless --cached is given.
+'''
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import seed  # noqa: E402
+from app import app, page_cache  # noqa: E402
+from datagen import WORDS  # noqa: E402
+
+
+def routes(venues, artists):
+    '''(name, method, url factory, form factory) for every route'''
+    venue = lambda rng: rng.randint(1, venues)  # noqa: E731
+    artist = lambda rng: rng.randint(1, artists)  # noqa: E731
+    venue_form = {
+      "name": 'Benchmark Venue', "city": 'San Francisco', "state": 'CA',
+      "address": '1 Main St', "phone": '4155550100', "genres": ['Jazz'],
+      "image_link": 'https://example.com/v.jpg',
+      "facebook_link": 'https://facebook.com/v', "seeking_description": ''
+    }
+    artist_form = dict(venue_form, name='Benchmark Artist')
+    return [
+      ('index', 'GET', lambda rng: '/', None),
+      ('venues', 'GET', lambda rng: '/venues', None),
+      ('venues_by_genre', 'GET', lambda rng: '/venues?genre=Jazz', None),
+      ('artists', 'GET', lambda rng: '/artists', None),
+      ('shows', 'GET', lambda rng: '/shows', None),
+      ('show_venue', 'GET', lambda rng: '/venues/%d' % venue(rng), None),
+      ('show_artist', 'GET', lambda rng: '/artists/%d' % artist(rng), None),
+      ('edit_venue', 'GET',
+       lambda rng: '/venues/%d/edit' % venue(rng), None),
+      ('edit_artist', 'GET',
+       lambda rng: '/artists/%d/edit' % artist(rng), None),
+      ('search_venues', 'POST', lambda rng: '/venues/search',
+       lambda rng: {"search_term": rng.choice(WORDS).lower()}),
+      ('search_artists', 'POST', lambda rng: '/artists/search',
+       lambda rng: {"search_term": rng.choice(WORDS).lower()}),
+      ('api_venue', 'GET',
+       lambda rng: '/api/v1/venues/%d' % venue(rng), None),
+      ('create_venue', 'POST', lambda rng: '/venues/create',
+       lambda rng: venue_form),
+      ('create_artist', 'POST', lambda rng: '/artists/create',
+       lambda rng: artist_form),
+      # a far-future day per request, so the shows never double-book
+      ('create_show', 'POST', lambda rng: '/shows/create',
+       lambda rng: {"venue_id": venue(rng), "artist_id": artist(rng),
+                    "start_time": str(dt.datetime(2030, 1, 1, 20) +
+                                      dt.timedelta(
+                                          days=rng.randrange(1000000)))}),
+    ]
+
+
+def statements(response):
+    for timing in response.headers.getlist('Server-Timing'):
+        match = re.search(r'desc="(\d+) queries"', timing)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(name, method, url, form, requests, cached, rng):
+    client = app.test_client()
+    timings = []
+    counts = []
+    for _ in range(requests):
+        if not cached:
+            page_cache.clear()
+        path, data = url(rng), form(rng) if form else None
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        timings.append((time.perf_counter() - started) * 1000)
+        counts.append(statements(response))
+        if response.status_code >= 400:
+            raise RuntimeError('%s %s returned %d'
+                               % (method, path, response.status_code))
+
+    if not cached:
+        page_cache.clear()
+    tracemalloc.start()
+    client.open(url(rng), method=method, data=form(rng) if form else None)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    known = [count for count in counts if count is not None]
+    return {
+      "route": name,
+      "requests": requests,
+      "p50_ms": statistics.median(timings),
+      "p95_ms": percentile(timings, 0.95),
+      "queries": max(known) if known else None,
+      "peak_memory_kb": peak / 1024
+    }
+
+
+def report(results, previous=None):
+    before = {row['route']: row for row in (previous or {}).get('routes', [])}
+    print('%-16s %9s %9s %8s %12s %10s' % ('route', 'p50 ms', 'p95 ms',
+                                           'queries', 'peak KiB', 'p50 diff'))
+    for row in results['routes']:
+        diff = ''
+        if row['route'] in before:
+            old = before[row['route']]['p50_ms']
+            diff = '%+.0f%%' % ((row['p50_ms'] - old) / old * 100)
+        print('%-16s %9.2f %9.2f %8s %12.1f %10s'
+              % (row['route'], row['p50_ms'], row['p95_ms'], row['queries'],
+                 row['peak_memory_kb'], diff))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--cached', action='store_true',
+                        help='leave the page cache on between requests')
+    parser.add_argument('--routes', nargs='+',
+                        help='only run the named routes')
+    parser.add_argument('--database-url',
+                        default='sqlite:////tmp/fyyur_route_benchmark.db')
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--compare', help='JSON results of a previous run')
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['SQL_METRICS'] = True
+    rng = random.Random(0)
+    with app.app_context():
+        seed(args.venues, args.artists, args.shows)
+        results = {
+          "dataset": {"venues": args.venues, "artists": args.artists,
+                      "shows": args.shows},
+          "database": args.database_url.split(':', 1)[0],
+          "python": platform.python_version(),
+          "cached": args.cached,
+          "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+          "routes": []
+        }
+        for name, method, url, form in routes(args.venues, args.artists):
+            if args.routes and name not in args.routes:
+                continue
+            results['routes'].append(measure(name, method, url, form,
+                                             args.requests, args.cached, rng))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as source:
+            previous = json.load(source)
+    report(results, previous)
+    if args.output:
+        with open(args.output, 'w') as target:
+            json.dump(results, target, indent=2)
+
+
+if __name__ == '__main__':
+    main()
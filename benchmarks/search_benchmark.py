@@ -0,0 +1,90 @@
+'''compares the trigram search path against the original ILIKE scan
+
+    python benchmarks/search_benchmark.py --sizes 10000 100000 1000000
+
+Uses a scratch SQLite database unless --database-url points at PostgreSQL,
+in which case the trigram path is served by the pg_trgm GIN index.
+'''
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db  # noqa: E402
+from models import Venue  # noqa: E402
+from search import venue_search  # noqa: E402
+
+SYLLABLES = ['ba', 'lo', 'ri', 'ven', 'tor', 'mu', 'sic', 'hal', 'cl',
+             'ub', 'jaz', 'zo', 'ne', 'ro', 'ck', 'sa', 'lon', 'de', 'ta']
+TERMS = ['club', 'jazz', 'venue 1', 'torhal', 'xyz', 'ba']
+
+
+def random_name(rng):
+    words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+             for _ in range(rng.randint(1, 3))]
+    return ' '.join(words).title()
+
+
+def seed(size, batch=10000):
+    '''recreates the venues table with `size` generated rows'''
+    rng = random.Random(size)
+    db.drop_all()
+    db.create_all()
+    for start in range(0, size, batch):
+        rows = [{
+            'name': random_name(rng) if i % 50 else 'Venue %d' % i,
+            'city': 'San Francisco', 'state': 'CA', 'genres': ['Jazz'],
+            'image_link': '', 'seeking_talent': False,
+            'seeking_description': '',
+        } for i in range(start, min(start + batch, size))]
+        db.session.execute(Venue.__table__.insert(), rows)
+    db.session.commit()
+    venue_search.invalidate()
+
+
+def median_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def ilike_scan(term):
+    return Venue.query.with_entities(Venue.id, Venue.name) \
+        .filter(Venue.name.ilike('%' + term + '%')).all()
+
+
+def run(sizes, repeat):
+    for size in sizes:
+        seed(size)
+        started = time.perf_counter()
+        venue_search.search('warm up')
+        build_ms = (time.perf_counter() - started) * 1000
+        print('\n%d venues (first search incl. index build: %.1f ms)'
+              % (size, build_ms))
+        print('%-10s %8s %12s %12s' % ('term', 'matches', 'ilike ms',
+                                       'trigram ms'))
+        for term in TERMS:
+            matches = len(venue_search.search(term))
+            scan = median_ms(lambda: ilike_scan(term), repeat)
+            indexed = median_ms(lambda: venue_search.search(term), repeat)
+            print('%-10s %8d %12.2f %12.2f' % (term, matches, scan, indexed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url',
+                        default='sqlite:////tmp/fyyur_search_benchmark.db')
+    args = parser.parse_args()
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    with app.app_context():
+        run(args.sizes, args.repeat)
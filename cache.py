@@ -0,0 +1,291 @@
+'''pluggable caches for rendered pages
+
+The backend is picked by PAGE_CACHE_BACKEND in config.py:
+
+* ``'lru'`` (default): in-process LRU with a TTL, per worker
+* ``'filesystem'``: pickled entries under PAGE_CACHE_DIR, shared by every
+  worker on the host
+* ``None``: caching disabled
+
+Every backend counts hits and misses for monitoring. The same backends
+hold template fragments for the ``{% cache %}`` tag (FragmentCache).
+'''
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, g, make_response, request, session
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+
+class BaseCache:
+    '''hit/miss accounting shared by the backends'''
+
+    name = None
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+          "backend": self.name,
+          "hits": self.hits,
+          "misses": self.misses,
+          "hit_ratio": self.hits / lookups if lookups else 0.0,
+          "entries": len(self)
+        }
+
+
+class NullCache(BaseCache):
+    '''caches nothing'''
+
+    name = 'null'
+
+    def _get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class LRUCache(BaseCache):
+    '''in-process least-recently-used cache with a time to live'''
+
+    name = 'lru'
+
+    def __init__(self, ttl, maxsize):
+        super().__init__(ttl)
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileSystemCache(BaseCache):
+    '''pickled entries in a directory, shared between processes'''
+
+    name = 'filesystem'
+
+    def __init__(self, ttl, directory):
+        super().__init__(ttl)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory,
+                            hashlib.sha1(key.encode()).hexdigest())
+
+    def _get(self, key):
+        try:
+            with open(self._path(key), 'rb') as entry:
+                expires, value = pickle.load(entry)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value):
+        # write then rename so readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as entry:
+            pickle.dump((time.time() + self.ttl, value), entry)
+        os.replace(tmp, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory)
+                   if not name.endswith('.tmp'))
+
+
+def from_config(config, prefix='PAGE_CACHE_'):
+    '''builds the backend named by <prefix>BACKEND'''
+    backend = config.get(prefix + 'BACKEND')
+    ttl = config.get(prefix + 'TTL', 60)
+    if backend == 'lru':
+        return LRUCache(ttl, config.get(prefix + 'SIZE', 512))
+    if backend == 'filesystem':
+        return FileSystemCache(ttl, config[prefix + 'DIR'])
+    if backend is None:
+        return NullCache(ttl)
+    raise ValueError('unknown cache backend %r' % backend)
+
+
+def cached_page(page_cache):
+    '''caches a view's rendered HTML under the request path
+
+    Requests with pending flash messages are neither served from nor
+    stored in the cache, since the layout renders those messages. Under
+    conditional_page the key includes the page's ETag: another worker's
+    write only clears its own lru cache, and a body cached before it must
+    not be served under the newer ETag.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if '_flashes' in session:
+                return view(*args, **kwargs)
+            key = 'page:' + request.full_path
+            if g.get('page_etag'):
+                key += ':' + g.page_etag
+            html = page_cache.get(key)
+            if html is None:
+                html = view(*args, **kwargs)
+                if isinstance(html, str):
+                    page_cache.set(key, html)
+            return html
+        return wrapper
+    return decorator
+
+
+def conditional_page(version):
+    '''answers conditional GETs before the view queries or renders anything
+
+    version(**view_args) returns the page's (etag, last_modified), or None
+    to run the view unconditionally. A matching If-None-Match (or, without
+    one, If-Modified-Since) gets an empty 304; every other response carries
+    the ETag and Last-Modified headers. The view runs with the ETag in
+    g.page_etag, which cached_page keys on.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            current = None
+            if '_flashes' not in session:
+                current = version(*args, **kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+            etag, last_modified = current
+            last_modified = last_modified.replace(microsecond=0).astimezone()
+            if request.if_none_match:
+                fresh = request.if_none_match.contains(etag)
+            else:
+                fresh = request.if_modified_since is not None and \
+                    last_modified <= request.if_modified_since
+            if fresh:
+                response = Response(status=304)
+            else:
+                g.page_etag = etag
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+class FragmentCache(Extension):
+    '''{% cache key, ... %}...{% endcache %} renders its body once per key
+
+    Fragments live in environment.fragment_cache, one of the backends above.
+    Nothing is ever invalidated, so a key has to change whenever the
+    fragment would: use ids with the updated_at of what it shows.
+    '''
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=NullCache(0))
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        method = '_render_async' if self.environment.is_async else '_render'
+        return nodes.CallBlock(
+            self.call_method(method, [nodes.List(parts)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        key = fragment_key(parts)
+        html = self.environment.fragment_cache.get(key)
+        if html is None:
+            html = caller()
+            self.environment.fragment_cache.set(key, str(html))
+        return Markup(html)
+
+    async def _render_async(self, parts, caller):
+        key = fragment_key(parts)
+        html = self.environment.fragment_cache.get(key)
+        if html is None:
+            html = await caller()
+            self.environment.fragment_cache.set(key, str(html))
+        return Markup(html)
+
+
+def fragment_key(parts):
+    return 'fragment:' + '|'.join(str(part) for part in parts)
@@ -9,3 +9,63 @@ DEBUG = True
 # Connect to the database
 SQLALCHEMY_DATABASE_URI = 'postgresql://virgil@localhost:5432/fyyur1'
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+# Read replicas for the queries of GET requests, used round-robin (see
+# routing.py). Empty sends everything to the primary above.
+SQLALCHEMY_REPLICA_URIS = []
+REPLICA_CHECK_SECONDS = 30
+REPLICA_RETRY_SECONDS = 5
+# PostgreSQL replicas replaying further behind than this count as down
+REPLICA_MAX_LAG_SECONDS = None
+# after a write, the client reads from the primary for this long
+REPLICA_READ_YOUR_WRITES_SECONDS = 10
+# async_app.py engine; None derives it (asyncpg/aiosqlite) from the URI above
+ASYNC_DATABASE_URI = None
+
+# Keyset pagination for the /shows listing
+SHOWS_PER_PAGE = 30
+SHOWS_MAX_PER_PAGE = 100
+# /shows/calendar: days shown without ?to=, and the longest range allowed
+CALENDAR_DAYS = 7
+CALENDAR_MAX_DAYS = 62
+
+# Occurrences one recurring show listing may expand to, the days after its
+# start they may reach, and the rows accepted per POST /api/v1/shows/bulk
+SHOW_MAX_OCCURRENCES = 366
+SHOW_MAX_RECURRENCE_DAYS = 731
+SHOW_BULK_MAX_ROWS = 10000
+
+# Ranked venue and artist search at /search (?limit= up to the maximum)
+SEARCH_RESULTS = 20
+SEARCH_MAX_RESULTS = 100
+
+# Rendered page cache for /, /venues, /artists and /shows: 'lru' (per
+# process), 'filesystem' (shared through PAGE_CACHE_DIR) or None
+PAGE_CACHE_BACKEND = 'lru'
+PAGE_CACHE_TTL = 60
+PAGE_CACHE_SIZE = 512
+PAGE_CACHE_DIR = os.path.join(basedir, 'instance', 'page_cache')
+
+# Rendered {% cache %} fragments (show tiles), same backends as the page
+# cache. Keys carry updated_at, so writes never need to clear them.
+FRAGMENT_CACHE_BACKEND = 'lru'
+FRAGMENT_CACHE_TTL = 3600
+FRAGMENT_CACHE_SIZE = 10000
+FRAGMENT_CACHE_DIR = os.path.join(basedir, 'instance', 'fragment_cache')
+
+# Count and time SQL per request (Server-Timing header and per endpoint
+# totals), and expose the totals at /debug/metrics
+SQL_METRICS = True
+DEBUG_METRICS = False
+
+# Local image proxy (/img/<venue|artist>/<id>/<size>): fetched originals and
+# resized variants are kept in IMAGE_CACHE_DIR, least recently served first
+# out once IMAGE_CACHE_MAX_BYTES is reached. IMAGE_FETCHER may name a
+# callable (url -> bytes) to replace the default HTTP fetcher.
+IMAGE_CACHE_DIR = os.path.join(basedir, 'instance', 'images')
+IMAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+IMAGE_SIZES = {
+  "thumb": (160, 160),
+  "tile": (400, 300),
+  "full": (1200, 900)
+}
+IMAGE_FETCHER = None
@@ -0,0 +1,249 @@
+'''synthetic catalog generator for load and scale testing
+
+    flask seed --venues 20000 --artists 50000 --shows 10000000
+
+Popularity follows a Zipf-like law everywhere production data does: a few
+cities hold most venues, a few venues and artists get most shows, and a
+few genres dominate. Rows are generated in batches and written with the
+importer's bulk_insert (COPY on PostgreSQL).
+'''
+import collections
+import datetime as dt
+import itertools
+import random
+import click
+from app import app, db
+from forms import Genres, VenueForm
+from importer import (
+  bulk_insert, refresh_derived_state, VENUE_COLUMNS, ARTIST_COLUMNS,
+  SHOW_COLUMNS
+  )
+from models import Venue, Artist, Show, touch
+from schedule import Schedule
+import summaries
+
+STATES = [state for state, label in VenueForm.state.kwargs['choices']]
+BIG_CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'),
+    ('Houston', 'TX'), ('Nashville', 'TN'), ('Austin', 'TX'),
+    ('San Francisco', 'CA'), ('Seattle', 'WA'), ('New Orleans', 'LA'),
+    ('Atlanta', 'GA'), ('Philadelphia', 'PA'), ('Miami', 'FL'),
+    ('Denver', 'CO'), ('Portland', 'OR'), ('Boston', 'MA'),
+    ('Detroit', 'MI'), ('Minneapolis', 'MN'), ('Washington', 'DC'),
+]
+WORDS = ['Blue', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Red', 'Echo',
+         'Hollow', 'Silver', 'Wild', 'Lucky', 'Neon', 'Crystal', 'Iron',
+         'Paper', 'Stone', 'River', 'Fox', 'Moon', 'Owl', 'Crow', 'Rose']
+VENUE_KINDS = ['Hall', 'Lounge', 'Club', 'Room', 'Theatre', 'Tavern',
+               'Ballroom', 'Social', 'Garage', 'Stage']
+ARTIST_KINDS = ['Band', 'Collective', 'Trio', 'Quartet', 'Project',
+                'Ensemble', 'Orchestra', 'Brothers', 'Sisters', 'Experience']
+# shows start in the evening and end before the next evening begins
+EVENING_HOURS = (18, 19, 20, 21, 22)
+DURATIONS = (60, 90, 120)
+# draws per wanted show before a day counts as full
+MAX_DRAWS = 50
+
+
+def zipf_cum_weights(n, skew):
+    '''cumulative weights of rank 1..n under a Zipf law with exponent skew'''
+    return list(itertools.accumulate(1 / rank ** skew
+                                     for rank in range(1, n + 1)))
+
+
+class CatalogGenerator:
+    '''draws venues, artists and shows with Zipf-skewed popularity'''
+
+    def __init__(self, skew=1.1, upcoming_ratio=0.3, past_days=730,
+                 future_days=180, rng_seed=None):
+        self.rng = random.Random(rng_seed)
+        self.skew = skew
+        self.upcoming_ratio = upcoming_ratio
+        self.past_days = past_days
+        self.future_days = future_days
+        self.now = dt.datetime.now().replace(minute=0, second=0,
+                                             microsecond=0)
+        self.cities = BIG_CITIES + [('%s City' % state.title(), state)
+                                    for state in STATES]
+        self.city_weights = zipf_cum_weights(len(self.cities), skew)
+        self.genres = [genre.name for genre in Genres]
+        self.rng.shuffle(self.genres)
+        self.genre_weights = zipf_cum_weights(len(self.genres), skew)
+
+    def name(self, kinds):
+        return '%s %s %s' % (self.rng.choice(WORDS), self.rng.choice(WORDS),
+                             self.rng.choice(kinds))
+
+    def pick_genres(self):
+        count = self.rng.choice((1, 1, 2, 2, 3))
+        return sorted(set(self.rng.choices(self.genres,
+                                           cum_weights=self.genre_weights,
+                                           k=count)))
+
+    def entity(self, kinds, number):
+        city, state = self.rng.choices(self.cities,
+                                       cum_weights=self.city_weights)[0]
+        return {
+          "name": self.name(kinds),
+          "city": city,
+          "state": state,
+          "address": '%d %s St' % (self.rng.randint(1, 9999),
+                                   self.rng.choice(WORDS)),
+          "phone": '%03d555%04d' % (self.rng.randint(201, 989),
+                                    number % 10000),
+          "genres": self.pick_genres(),
+          "image_link": 'https://picsum.photos/seed/%d/600/400' % number,
+          "facebook_link": None,
+          "website_link": None,
+          "seeking_talent": self.rng.random() < 0.3,
+          "seeking_venue": self.rng.random() < 0.3,
+          "seeking_description": '',
+          "created_date": self.now - dt.timedelta(
+              minutes=self.rng.randint(0, self.past_days * 1440))
+        }
+
+    def venues(self, count):
+        return (self.entity(VENUE_KINDS, number) for number in range(count))
+
+    def artists(self, count):
+        return (self.entity(ARTIST_KINDS, number) for number in range(count))
+
+    def show_days(self, count):
+        '''{day offset from today: shows}, upcoming with upcoming_ratio'''
+        days = collections.Counter()
+        for _ in range(count):
+            if self.rng.random() < self.upcoming_ratio:
+                days[self.rng.randint(1, self.future_days)] += 1
+            else:
+                days[-self.rng.randint(1, self.past_days)] += 1
+        return days
+
+    def day_shows(self, midnight, quota, venues, artists, schedule):
+        '''quota evening shows on one day, redrawing any that double-book'''
+        shows = []
+        for _ in range(MAX_DRAWS * quota):
+            if len(shows) == quota:
+                return shows
+            show = {
+              "venue_id": self.rng.choices(venues[0],
+                                           cum_weights=venues[1])[0],
+              "artist_id": self.rng.choices(artists[0],
+                                            cum_weights=artists[1])[0],
+              "start_time": midnight + dt.timedelta(
+                  hours=self.rng.choice(EVENING_HOURS),
+                  minutes=self.rng.choice((0, 30))),
+              "duration_minutes": self.rng.choice(DURATIONS)
+            }
+            if not schedule.book(show, None):
+                shows.append(show)
+        if len(shows) < quota:
+            raise RuntimeError('cannot fit %d shows on %s without double '
+                               'bookings' % (quota, midnight.date()))
+        return shows
+
+    def shows(self, count, venue_ids, artist_ids, batch_size, session):
+        '''batches of count shows; low ranks of each id list are popular
+
+        Shows are drawn one day at a time. No venue or artist is booked
+        twice at once, so draws on an entity whose evening is full are
+        redrawn and the busiest ones end up with fewer shows than their
+        rank alone would give them. Evenings never overlap each other, so
+        only one day of bookings (and of stored shows) is held at a time.
+        '''
+        venues = (venue_ids, zipf_cum_weights(len(venue_ids), self.skew))
+        artists = (artist_ids, zipf_cum_weights(len(artist_ids), self.skew))
+        batch = []
+        for day, quota in sorted(self.show_days(count).items()):
+            midnight = self.now.replace(hour=0) + dt.timedelta(days=day)
+            schedule = Schedule().load_window(
+                session, midnight + dt.timedelta(hours=EVENING_HOURS[0]),
+                midnight + dt.timedelta(hours=EVENING_HOURS[-1] + 1,
+                                        minutes=max(DURATIONS)))
+            batch.extend(self.day_shows(midnight, quota, venues, artists,
+                                        schedule))
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+        if batch:
+            yield batch
+
+
+def batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def generate(venues, artists, shows, batch_size=50000, progress=None,
+             **options):
+    '''appends generated rows to the database, committing per batch
+
+    Shows are spread over every venue and artist in the database, not only
+    the ones generated in this run, without double-booking any of them.
+    Returns the number of shows written, which is always shows when there
+    are venues and artists.
+    '''
+    generator = CatalogGenerator(**options)
+    for model, columns, rows in (
+            (Venue, VENUE_COLUMNS, generator.venues(venues)),
+            (Artist, ARTIST_COLUMNS, generator.artists(artists))):
+        for batch in batches(rows, batch_size):
+            bulk_insert(db.session, model.__table__,
+                        columns + ['created_date'], batch)
+            db.session.commit()
+    venue_ids = [id for id, in db.session.query(Venue.id)]
+    artist_ids = [id for id, in db.session.query(Artist.id)]
+    generator.rng.shuffle(venue_ids)
+    generator.rng.shuffle(artist_ids)
+    done = 0
+    if shows and venue_ids and artist_ids:
+        for batch in generator.shows(shows, venue_ids, artist_ids,
+                                     batch_size, db.session):
+            bulk_insert(db.session, Show.__table__, SHOW_COLUMNS, batch)
+            db.session.commit()
+            done += len(batch)
+            if progress:
+                progress(done)
+        # new shows can land on any page
+        touch(db.session.connection(), Venue)
+        touch(db.session.connection(), Artist)
+        summaries.rebuild(db.session)
+        db.session.commit()
+    refresh_derived_state()
+    return done
+
+
+@app.cli.command('seed')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=2000, show_default=True)
+@click.option('--shows', default=100000, show_default=True)
+@click.option('--upcoming-ratio', default=0.3, show_default=True,
+              help='Share of shows scheduled in the future.')
+@click.option('--skew', default=1.1, show_default=True,
+              help='Zipf exponent for city, genre, venue and artist '
+                   'popularity.')
+@click.option('--past-days', default=730, show_default=True)
+@click.option('--future-days', default=180, show_default=True)
+@click.option('--batch-size', default=50000, show_default=True)
+@click.option('--seed', 'rng_seed', type=int,
+              help='Random seed for a reproducible dataset.')
+def seed_command(venues, artists, shows, upcoming_ratio, skew, past_days,
+                 future_days, batch_size, rng_seed):
+    '''Generate synthetic venues, artists and shows.'''
+    started = dt.datetime.now()
+
+    def progress(done):
+        elapsed = (dt.datetime.now() - started).total_seconds()
+        click.echo('%d/%d shows (%.0f rows/s)'
+                   % (done, shows, done / elapsed if elapsed else 0))
+
+    written = generate(venues, artists, shows, batch_size, progress,
+                       skew=skew, upcoming_ratio=upcoming_ratio,
+                       past_days=past_days, future_days=future_days,
+                       rng_seed=rng_seed)
+    click.echo('Generated %d venues, %d artists and %d shows in %.1fs'
+               % (venues, artists, written,
+                  (dt.datetime.now() - started).total_seconds()))
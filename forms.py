@@ -1,10 +1,12 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+import itertools
 from email import message
 from wsgiref.validate import validator
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, Regexp, ValidationError
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, Regexp, ValidationError, NumberRange
 from enum import Enum
+from dateutil.rrule import rrulestr
 import phonenumbers
 import re
 
@@ -35,7 +37,7 @@ def genreChoices(genres):
         choices.append((genre.name, genre.value))
     return choices
 
-def validate_phone(field):
+def validate_phone(form, field):
     if len(field.data) != 10:
         raise ValidationError('Invalid phone number.')
     try:
@@ -45,6 +47,88 @@ def validate_phone(field):
     except:
         return
 
+# Recurrence rule parts accepted for show listings. With these, every day,
+# week, month or year the rule steps through has a date, and dateutil never
+# scans on to the year 9999 for one, as it does for rules like
+# FREQ=DAILY;BYMONTH=2;BYMONTHDAY=30.
+RECURRENCE_FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+RECURRENCE_PARTS = ('FREQ', 'INTERVAL', 'COUNT', 'UNTIL', 'WKST', 'BYDAY',
+                    'BYMONTHDAY')
+RECURRENCE_WEEKDAY = re.compile(r'^([+-]?[1-4])?(MO|TU|WE|TH|FR|SA|SU)$')
+RECURRENCE_MONTHDAY = re.compile(r'^[+-]?([1-9]|1[0-9]|2[0-8])$')
+MAX_RECURRENCE_INTERVAL = 366
+
+def check_recurrence(rule):
+    '''raises ValueError unless rule only uses the accepted parts'''
+    text = rule.strip().upper()
+    if text.startswith('RRULE:'):
+        text = text[len('RRULE:'):]
+    if 'DTSTART' in text:
+        raise ValueError('Recurrence rules cannot set DTSTART; the start '
+                         'time is the first date.')
+    parts = {}
+    for part in text.split(';'):
+        name, _, value = part.partition('=')
+        if name not in RECURRENCE_PARTS:
+            raise ValueError('Unsupported recurrence rule part: %s.' % name)
+        parts[name] = value
+    frequency = parts.get('FREQ')
+    if frequency not in RECURRENCE_FREQUENCIES:
+        raise ValueError('FREQ must be DAILY, WEEKLY, MONTHLY or YEARLY.')
+    if 'COUNT' not in parts and 'UNTIL' not in parts:
+        raise ValueError('Recurrence rules need a COUNT or an UNTIL.')
+    interval = parts.get('INTERVAL', '1')
+    if not interval.isdigit() or \
+            not 1 <= int(interval) <= MAX_RECURRENCE_INTERVAL:
+        raise ValueError('INTERVAL must be between 1 and %d.'
+                         % MAX_RECURRENCE_INTERVAL)
+    weekdays = parts['BYDAY'].split(',') if 'BYDAY' in parts else []
+    for weekday in weekdays:
+        match = RECURRENCE_WEEKDAY.match(weekday)
+        if not match:
+            raise ValueError('BYDAY takes weekdays, in a month or year '
+                             'optionally numbered from 1 to 4 or -1 to -4.')
+        if match.group(1) and frequency in ('DAILY', 'WEEKLY'):
+            raise ValueError('Numbered BYDAY weekdays need FREQ=MONTHLY or '
+                             'FREQ=YEARLY.')
+    if weekdays and frequency == 'DAILY' and int(interval) % 7 == 0:
+        raise ValueError('Use FREQ=WEEKLY to repeat on given weekdays every '
+                         'few weeks.')
+    if 'BYMONTHDAY' in parts:
+        if frequency not in ('MONTHLY', 'YEARLY') or weekdays:
+            raise ValueError('BYMONTHDAY needs FREQ=MONTHLY or FREQ=YEARLY '
+                             'and no BYDAY.')
+        if not all(RECURRENCE_MONTHDAY.match(day)
+                   for day in parts['BYMONTHDAY'].split(',')):
+            raise ValueError('BYMONTHDAY takes days from 1 to 28 or -1 to '
+                             '-28.')
+
+def occurrences(start, rule, limit, days):
+    '''start times of an RRULE (e.g. FREQ=WEEKLY;BYDAY=FR;COUNT=26)
+    beginning at start; raises ValueError for bad rules and for ones with no
+    dates, more than limit of them or dates more than days after start'''
+    if start is None:
+        raise ValueError('Not a valid datetime value.')
+    if not rule:
+        return [start]
+    if not isinstance(rule, str):
+        raise ValueError('Recurrence rules are text.')
+    check_recurrence(rule)
+    try:
+        times = rrulestr(rule.strip(), dtstart=start)
+    except (ValueError, TypeError) as ex:
+        raise ValueError('Invalid recurrence rule: %s' % ex)
+    times = list(itertools.islice(times, limit + 1))
+    if not times:
+        raise ValueError('Recurrence rule has no dates from the start time.')
+    if len(times) > limit:
+        raise ValueError('Recurrence rule repeats more than %d times.'
+                         % limit)
+    if times[-1] > start + timedelta(days=days):
+        raise ValueError('Recurrence rule runs for more than %d days.'
+                         % days)
+    return times
+
 class ShowForm(Form):
     artist_id = StringField(
         'artist_id'
@@ -57,6 +141,14 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[NumberRange(1, 24 * 60)],
+        default=120
+    )
+    recurrence = StringField(
+        'recurrence'
+    )
 
 class VenueForm(Form):
     name = StringField(
@@ -0,0 +1,281 @@
+'''local proxy and resized-thumbnail cache for venue and artist images
+
+    /img/<venue|artist>/<id>/<size>
+
+fetches the entity's image_link once, stores it and every resized variant
+under IMAGE_CACHE_DIR and serves them with an ETag. The cache is kept under
+IMAGE_CACHE_MAX_BYTES by evicting the least recently served files. The
+fetcher is pluggable (IMAGE_FETCHER) so tests can serve local files.
+
+Only public http(s) addresses are fetched, redirects included, and only
+content that decodes as an image is kept and served, always re-encoded.
+That needs Pillow; without it every image is a 404.
+'''
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+import urllib.parse
+from flask import Blueprint, abort, current_app, send_file, url_for
+from werkzeug.utils import import_string
+from app import db
+from models import Venue, Artist
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+images = Blueprint('images', __name__, url_prefix='/img')
+
+MODELS = {'venue': Venue, 'artist': Artist}
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+MAX_REDIRECTS = 5
+REDIRECTS = (301, 302, 303, 307, 308)
+
+
+class FetchError(Exception):
+    pass
+
+
+NAT64 = ipaddress.ip_network('64:ff9b::/96')
+
+
+def is_public(address):
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if ip.version == 6:
+        # IPv4 wrapped in IPv6 is judged by the IPv4 address
+        if ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        elif ip in NAT64:
+            ip = ipaddress.IPv4Address(int(ip) & 0xffffffff)
+    return ip.is_global
+
+
+def public_address(host, port):
+    '''the address to connect to for host, refusing non-public ones
+
+    Every address the name resolves to has to be public, so the proxy
+    cannot be pointed at loopback, private or link-local services.
+    '''
+    try:
+        infos = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (OSError, UnicodeError) as ex:
+        raise FetchError('cannot resolve %r: %s' % (host, ex))
+    addresses = [info[4][0] for info in infos]
+    for address in addresses:
+        if not is_public(address):
+            raise FetchError('%r resolves to non-public %s' % (host, address))
+    if not addresses:
+        raise FetchError('cannot resolve %r' % host)
+    return addresses[0]
+
+
+class PinnedHTTPConnection(http.client.HTTPConnection):
+    '''connects to an address checked by public_address, not a new lookup'''
+
+    def __init__(self, host, address, port, timeout):
+        super().__init__(host, port, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port),
+                                            self.timeout)
+
+
+class PinnedHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, host, address, port, timeout):
+        super().__init__(host, port, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port),
+                                        self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+def fetch_url(url):
+    '''downloads a public http(s) image, checking every redirect'''
+    for _ in range(MAX_REDIRECTS + 1):
+        try:
+            parts = urllib.parse.urlsplit(url)
+            port = parts.port
+        except ValueError as ex:
+            raise FetchError(str(ex))
+        if parts.scheme.lower() not in ('http', 'https') or not parts.hostname:
+            raise FetchError('unsupported image URL %r' % url)
+        https = parts.scheme.lower() == 'https'
+        port = port or (443 if https else 80)
+        address = public_address(parts.hostname, port)
+        connection = (PinnedHTTPSConnection if https else
+                      PinnedHTTPConnection)(parts.hostname, address, port, 10)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            if response.status in REDIRECTS:
+                location = response.getheader('Location')
+                if not location:
+                    raise FetchError('redirect without a Location')
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if response.status != 200:
+                raise FetchError('HTTP %d from %r' % (response.status, url))
+            content = response.read(MAX_SOURCE_BYTES + 1)
+        except (OSError, http.client.HTTPException) as ex:
+            raise FetchError(str(ex))
+        finally:
+            connection.close()
+        if len(content) > MAX_SOURCE_BYTES:
+            raise FetchError('image larger than %d bytes' % MAX_SOURCE_BYTES)
+        return content
+    raise FetchError('more than %d redirects' % MAX_REDIRECTS)
+
+
+def decode(content):
+    '''content as a PIL image; anything else is refused, never passed on'''
+    if Image is None:
+        raise FetchError('serving images needs the Pillow package')
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.load()
+    except Exception as ex:
+        raise FetchError('not a decodable image: %s' % ex)
+    return image
+
+
+def resize(content, size):
+    '''JPEG (or PNG, when transparent) scaled down to fit within size'''
+    image = decode(content)
+    image.thumbnail(size)
+    output = io.BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image.save(output, 'PNG', optimize=True)
+    else:
+        image.convert('RGB').save(output, 'JPEG', quality=82,
+                                  optimize=True, progressive=True)
+    return output.getvalue()
+
+
+class ImageCache:
+    '''source images and their resized variants on disk, with an LRU cap'''
+
+    def __init__(self, directory, max_bytes, fetcher=fetch_url):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fetcher = fetcher
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _write(self, path, content):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as target:
+            target.write(content)
+        os.replace(tmp, path)
+        self.evict()
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as source:
+                content = source.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return content
+
+    def source(self, url):
+        '''the original image bytes, fetched on first use'''
+        path = os.path.join(self.directory,
+                            hashlib.sha1(url.encode()).hexdigest())
+        content = self._read(path)
+        if content is None:
+            content = self.fetcher(url)
+            decode(content)
+            self._write(path, content)
+        return content
+
+    def variant(self, url, size_name, size):
+        '''(path, etag) of url scaled to size, fetching it if needed'''
+        key = hashlib.sha1(url.encode()).hexdigest()
+        etag = '%s-%s' % (key, size_name)
+        path = os.path.join(self.directory, etag)
+        if os.path.exists(path):
+            if sniff_mimetype(path):
+                os.utime(path)
+                return path, etag
+            # not something resize() wrote; make it again
+            os.remove(path)
+        self._write(path, resize(self.source(url), size))
+        return path, etag
+
+    def evict(self):
+        '''removes least recently used files until under max_bytes'''
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+def image_url(kind, entity_id, size='tile'):
+    '''URL of a proxied, resized venue or artist image'''
+    return url_for('images.image', kind=kind, entity_id=entity_id, size=size)
+
+
+@images.route('/<kind>/<int:entity_id>/<size>')
+def image(kind, entity_id, size):
+    '''serves the entity's image scaled to one of IMAGE_SIZES'''
+    sizes = current_app.config['IMAGE_SIZES']
+    if kind not in MODELS or size not in sizes:
+        abort(404)
+    model = MODELS[kind]
+    url = db.session.query(model.image_link) \
+        .filter(model.id == entity_id).scalar()
+    if not url:
+        abort(404)
+    cache = current_app.extensions['image_cache']
+    try:
+        path, etag = cache.variant(url, size, tuple(sizes[size]))
+    except (FetchError, OSError, ValueError):
+        # unreachable, not public or not an image
+        abort(404)
+    return send_file(path, mimetype=sniff_mimetype(path), etag=etag,
+                     conditional=True, max_age=86400)
+
+
+def sniff_mimetype(path):
+    '''type of a variant written by resize(), None for anything else'''
+    with open(path, 'rb') as source:
+        head = source.read(8)
+    if head.startswith(b'\x89PNG'):
+        return 'image/png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    return None
+
+
+def init_app(app):
+    fetcher = app.config.get('IMAGE_FETCHER') or fetch_url
+    if isinstance(fetcher, str):
+        fetcher = import_string(fetcher)
+    app.extensions['image_cache'] = ImageCache(
+        app.config['IMAGE_CACHE_DIR'], app.config['IMAGE_CACHE_MAX_BYTES'],
+        fetcher)
+    app.register_blueprint(images)
+    app.add_template_global(image_url)
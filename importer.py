@@ -0,0 +1,296 @@
+'''bulk loading of venues, artists and shows
+
+    flask import venues venues.csv
+    flask import shows shows.ndjson --batch-size 20000 --rejects bad.ndjson
+
+Rows are validated with the rules of the forms in forms.py and written in
+batches: COPY on PostgreSQL, executemany on other engines. Rejected rows
+are reported with their line number and errors instead of aborting the
+load; that includes shows double-booking a venue or an artist.
+'''
+import collections
+import csv
+import datetime as dt
+import io
+import json
+import click
+from werkzeug.datastructures import MultiDict
+from app import app, db, page_cache
+from forms import VenueForm, ArtistForm
+from models import Venue, Artist, Show, genre_name, touch
+from models import DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+from schedule import Schedule
+from search import venue_search, artist_search, catalog_search
+import summaries
+
+VENUE_COLUMNS = ['name', 'city', 'state', 'address', 'phone', 'genres',
+                 'image_link', 'facebook_link', 'website_link',
+                 'seeking_talent', 'seeking_description']
+ARTIST_COLUMNS = ['name', 'city', 'state', 'phone', 'genres', 'image_link',
+                  'facebook_link', 'website_link', 'seeking_venue',
+                  'seeking_description']
+SHOW_COLUMNS = ['artist_id', 'venue_id', 'start_time',
+                'duration_minutes']
+
+
+# an NDJSON line that is not JSON at all, rejected by import_rows
+BadLine = collections.namedtuple('BadLine', 'text error')
+
+
+def read_rows(path):
+    '''yields (line number, row dict) from a CSV or NDJSON file'''
+    with open(path, newline='') as source:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for number, line in enumerate(source, 1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError as ex:
+                        yield number, BadLine(line.rstrip('\n'), str(ex))
+        else:
+            for number, row in enumerate(csv.DictReader(source), 2):
+                yield number, row
+
+
+def form_data(row):
+    '''converts a CSV or NDJSON row into form data'''
+    data = MultiDict()
+    for name, value in row.items():
+        if value is None:
+            continue
+        if name == 'genres':
+            if isinstance(value, str):
+                value = [genre for genre in value.split(',') if genre.strip()]
+            data.setlist(name, [genre_name(genre.strip()) or genre.strip()
+                                for genre in value])
+        elif isinstance(value, bool):
+            data[name] = 'y' if value else ''
+        else:
+            data[name] = str(value)
+    return data
+
+
+class FormValidator:
+    '''validates venue or artist rows with their WTForms form'''
+
+    def __init__(self, form_class, columns):
+        self.form_class = form_class
+        self.columns = columns
+
+    def __call__(self, row):
+        form = self.form_class(formdata=form_data(row),
+                               meta={'csrf': False})
+        if not form.validate():
+            return None, form.errors
+        values = {name: form.data[name] for name in self.columns}
+        values['image_link'] = values['image_link'] or ''
+        values['seeking_description'] = values['seeking_description'] or ''
+        values['created_date'] = dt.datetime.now()
+        return values, None
+
+
+class ShowValidator:
+    '''ShowForm's rules plus foreign key checks, without a form per row'''
+
+    columns = SHOW_COLUMNS
+
+    def __init__(self, session, rows=None):
+        '''loads every venue and artist id, or only those rows refer to'''
+        self.venue_ids = self.known_ids(session, Venue, 'venue_id', rows)
+        self.artist_ids = self.known_ids(session, Artist, 'artist_id', rows)
+
+    @staticmethod
+    def known_ids(session, model, name, rows):
+        query = session.query(model.id)
+        if rows is not None:
+            ids = set()
+            for row in rows:
+                try:
+                    ids.add(int(row.get(name)))
+                except (AttributeError, TypeError, ValueError):
+                    pass
+            query = query.filter(model.id.in_(sorted(ids)))
+        return {id for id, in query}
+
+    def __call__(self, row):
+        errors = {}
+        values = {}
+        for name, known in (('venue_id', self.venue_ids),
+                            ('artist_id', self.artist_ids)):
+            try:
+                values[name] = int(row.get(name))
+            except (TypeError, ValueError):
+                errors[name] = ['Not a valid integer value.']
+                continue
+            if values[name] not in known:
+                errors[name] = ['No such %s.' % name[:-3]]
+        try:
+            values['start_time'] = dt.datetime.fromisoformat(
+                str(row.get('start_time')).strip())
+        except ValueError:
+            errors['start_time'] = ['Not a valid datetime value.']
+        try:
+            values['duration_minutes'] = int(row.get('duration_minutes') or
+                                             DEFAULT_SHOW_MINUTES)
+        except (TypeError, ValueError):
+            errors['duration_minutes'] = ['Not a valid integer value.']
+        else:
+            if not 1 <= values['duration_minutes'] <= MAX_SHOW_MINUTES:
+                errors['duration_minutes'] = [
+                    'Number must be between 1 and %d.' % MAX_SHOW_MINUTES]
+        return (None, errors) if errors else (values, None)
+
+
+def validator_for(kind, session):
+    if kind == 'venues':
+        return FormValidator(VenueForm, VENUE_COLUMNS)
+    if kind == 'artists':
+        return FormValidator(ArtistForm, ARTIST_COLUMNS)
+    return ShowValidator(session)
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (list, tuple)):
+        return '{' + ','.join('"%s"' % item for item in value) + '}'
+    if isinstance(value, dt.datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def bulk_insert(session, table, columns, rows):
+    '''inserts row dicts in the session's transaction
+
+    Uses COPY on PostgreSQL and a single executemany elsewhere.
+    '''
+    if not rows:
+        return
+    connection = session.connection()
+    if connection.dialect.name != 'postgresql':
+        connection.execute(table.insert(),
+                           [{name: row[name] for name in columns}
+                            for row in rows])
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([copy_value(row[name]) for name in columns])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            "COPY %s (%s) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+            % (table.name, ', '.join(columns)), buffer)
+    finally:
+        cursor.close()
+
+
+def refresh_derived_state():
+    '''drops caches that bulk inserts bypass (they skip mapper events)'''
+    page_cache.clear()
+    venue_search.invalidate()
+    artist_search.invalidate()
+    catalog_search.invalidate()
+
+
+def insert_batch(kind, table, columns, batch):
+    '''writes and commits one batch, counting new shows into their pages'''
+    bulk_insert(db.session, table, columns, batch)
+    if kind == 'shows' and batch:
+        connection = db.session.connection()
+        touch(connection, Venue, sorted({row['venue_id'] for row in batch}))
+        touch(connection, Artist,
+              sorted({row['artist_id'] for row in batch}))
+        summaries.add_shows(connection, batch)
+    db.session.commit()
+
+
+def drop_conflicts(batch, reject):
+    '''rejects the shows of a batch overlapping stored or earlier shows'''
+    schedule = Schedule().load(db.session,
+                               [values for number, row, values in batch])
+    kept = []
+    for number, row, values in batch:
+        errors = schedule.book(values, 'line %d' % number)
+        if errors:
+            reject(number, row, errors)
+        else:
+            kept.append((number, row, values))
+    return kept
+
+
+def import_rows(kind, rows, batch_size=5000, on_reject=None):
+    '''validates and loads (line number, row) pairs, committing per batch
+
+    Returns the number of rows loaded and rejected.
+    '''
+    table = {'venues': Venue, 'artists': Artist, 'shows': Show}[kind] \
+        .__table__
+    validate = validator_for(kind, db.session)
+    columns = list(validate.columns)
+    if kind != 'shows':
+        columns.append('created_date')
+    loaded = rejected = 0
+
+    def reject(number, row, errors):
+        nonlocal rejected
+        rejected += 1
+        if on_reject:
+            on_reject(number, row, errors)
+
+    def flush(batch):
+        if kind == 'shows':
+            batch = drop_conflicts(batch, reject)
+        insert_batch(kind, table, columns,
+                     [values for number, row, values in batch])
+        return len(batch)
+
+    batch = []
+    for number, row in rows:
+        if isinstance(row, BadLine):
+            reject(number, row.text,
+                   {"row": ['Not valid JSON: %s' % row.error]})
+            continue
+        if not isinstance(row, dict):
+            reject(number, row, {"row": ['Not a JSON object.']})
+            continue
+        values, errors = validate(row)
+        if errors:
+            reject(number, row, errors)
+            continue
+        batch.append((number, row, values))
+        if len(batch) >= batch_size:
+            loaded += flush(batch)
+            batch = []
+    loaded += flush(batch)
+    refresh_derived_state()
+    return loaded, rejected
+
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=5000, show_default=True)
+@click.option('--rejects', type=click.File('w'),
+              help='Write rejected rows and their errors here as NDJSON.')
+def import_command(kind, path, batch_size, rejects):
+    '''Bulk load venues, artists or shows from a CSV or NDJSON file.'''
+    shown = []
+
+    def on_reject(number, row, errors):
+        if rejects:
+            rejects.write(json.dumps({"line": number, "row": row,
+                                      "errors": errors}) + '\n')
+        if len(shown) < 10:
+            shown.append(number)
+            click.echo('line %d rejected: %s' % (number, errors), err=True)
+
+    started = dt.datetime.now()
+    loaded, rejected = import_rows(kind, read_rows(path), batch_size,
+                                   on_reject)
+    click.echo('%d %s loaded, %d rejected in %.1fs'
+               % (loaded, kind, rejected,
+                  (dt.datetime.now() - started).total_seconds()))
@@ -0,0 +1,163 @@
+'''per-request SQL instrumentation
+
+Cursor execution hooks count the statements each request issues and time
+them. Every response carries the totals in a Server-Timing header, and the
+numbers are aggregated per endpoint for the /debug/metrics page, which is
+only served when DEBUG_METRICS is set.
+'''
+import threading
+import time
+from flask import (
+  Blueprint, abort, current_app, g, has_request_context, jsonify,
+  render_template, request
+  )
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+debug = Blueprint('debug', __name__, url_prefix='/debug')
+UNMATCHED = '<unmatched>'
+
+
+class RequestStats:
+    '''statements, DB time and slowest statement of one request'''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement, duration):
+        self.statements += 1
+        self.db_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+
+class EndpointMetrics:
+    '''running totals per endpoint, shared by all request threads'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def add(self, endpoint, stats, total_time):
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {
+              "requests": 0, "total_ms": 0.0, "db_ms": 0.0,
+              "statements": 0, "max_statements": 0,
+              "slowest_ms": 0.0, "slowest_statement": None
+            })
+            entry["requests"] += 1
+            entry["total_ms"] += total_time * 1000
+            entry["db_ms"] += stats.db_time * 1000
+            entry["statements"] += stats.statements
+            entry["max_statements"] = max(entry["max_statements"],
+                                          stats.statements)
+            if stats.slowest_time * 1000 > entry["slowest_ms"]:
+                entry["slowest_ms"] = stats.slowest_time * 1000
+                entry["slowest_statement"] = stats.slowest_statement
+
+    def snapshot(self):
+        '''per endpoint totals plus averages, busiest DB time first'''
+        with self._lock:
+            rows = [dict(entry, endpoint=endpoint)
+                    for endpoint, entry in self._endpoints.items()]
+        for row in rows:
+            row["avg_ms"] = row["total_ms"] / row["requests"]
+            row["avg_db_ms"] = row["db_ms"] / row["requests"]
+            row["avg_statements"] = row["statements"] / row["requests"]
+        return sorted(rows, key=lambda row: -row["db_ms"])
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+endpoint_metrics = EndpointMetrics()
+
+
+def current_stats():
+    '''the RequestStats of the active request, if it is being measured'''
+    if has_request_context():
+        return g.get('sql_stats')
+    return None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context,
+                         executemany):
+    duration = time.perf_counter() - conn.info['query_started'].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, duration)
+
+
+@event.listens_for(Engine, 'handle_error')
+def handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    started = context.connection.info.get('query_started') \
+        if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def start_request():
+    if current_app.config.get('SQL_METRICS'):
+        g.sql_stats = RequestStats()
+
+
+def finish_request(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+    total_time = time.perf_counter() - stats.started
+    response.headers.add('Server-Timing', 'db;dur=%.2f;desc="%d queries"'
+                         % (stats.db_time * 1000, stats.statements))
+    response.headers.add('Server-Timing', 'app;dur=%.2f'
+                         % (total_time * 1000))
+    # not the path: every unknown URL would add an entry
+    endpoint_metrics.add(request.endpoint or UNMATCHED, stats, total_time)
+    return response
+
+
+def init_app(app, page_cache=None):
+    '''installs the request hooks and the /debug blueprint'''
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    app.extensions['page_cache'] = page_cache
+    app.register_blueprint(debug)
+
+
+@debug.before_request
+def require_debug_metrics():
+    if not current_app.config.get('DEBUG_METRICS'):
+        abort(404)
+
+
+@debug.route('/metrics')
+def show_metrics():
+    '''per endpoint statement counts and DB time'''
+    page_cache = current_app.extensions.get('page_cache')
+    data = {
+      "endpoints": endpoint_metrics.snapshot(),
+      "page_cache": page_cache.stats() if page_cache else None
+    }
+    if request.args.get('format') == 'json':
+        return jsonify(data)
+    return render_template('pages/metrics.html', metrics=data)
+
+
+@debug.route('/cache')
+def cache_stats():
+    '''page cache hit/miss counters'''
+    page_cache = current_app.extensions.get('page_cache')
+    return jsonify(page_cache.stats() if page_cache else {})
@@ -0,0 +1,54 @@
+"""add catalog search vectors
+
+Revision ID: a7c3e9f24b18
+Revises: f3a9d61c7e52
+Create Date: 2026-10-18 13:20:47.604113
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f24b18'
+down_revision = 'f3a9d61c7e52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # PostgreSQL only; SQLite databases are searched through search.TextIndex
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('''
+CREATE OR REPLACE FUNCTION catalog_search_vector() RETURNS trigger AS $$
+BEGIN
+  NEW.search_vector :=
+    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' ||
+                                    coalesce(NEW.state, '')), 'B') ||
+    setweight(to_tsvector('simple', replace(
+      array_to_string(NEW.genres, ' '), '_', ' ')), 'C');
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+''')
+    for table in ('venues', 'artists'):
+        op.execute('ALTER TABLE %s ADD COLUMN search_vector tsvector' % table)
+        op.execute('CREATE TRIGGER {0}_search_vector '
+                   'BEFORE INSERT OR UPDATE OF name, city, state, genres '
+                   'ON {0} FOR EACH ROW '
+                   'EXECUTE PROCEDURE catalog_search_vector()'.format(table))
+        # fires the trigger to fill existing rows
+        op.execute('UPDATE %s SET name = name' % table)
+        op.execute('CREATE INDEX ix_{0}_search_vector ON {0} '
+                   'USING gin (search_vector)'.format(table))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('artists', 'venues'):
+        op.execute('DROP INDEX ix_%s_search_vector' % table)
+        op.execute('DROP TRIGGER {0}_search_vector ON {0}'.format(table))
+        op.execute('ALTER TABLE %s DROP COLUMN search_vector' % table)
+    op.execute('DROP FUNCTION catalog_search_vector()')
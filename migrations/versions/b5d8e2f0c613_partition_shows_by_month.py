@@ -0,0 +1,103 @@
+"""partition shows by month
+
+Revision ID: b5d8e2f0c613
+Revises: a7c3e9f24b18
+Create Date: 2026-10-18 14:05:31.250771
+
+"""
+import datetime as dt
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d8e2f0c613'
+down_revision = 'a7c3e9f24b18'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_shows_venue_id_start_time', 'venue_id, start_time'),
+    ('ix_shows_artist_id_start_time', 'artist_id, start_time'),
+    ('ix_shows_start_time_id', 'start_time, id'),
+]
+
+
+def next_month(month):
+    return dt.datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def upgrade():
+    # PostgreSQL only; SQLite keeps the single shows table
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    op.execute('ALTER TABLE shows RENAME TO shows_unpartitioned')
+    op.execute('ALTER TABLE shows_unpartitioned '
+               'RENAME CONSTRAINT shows_pkey TO shows_unpartitioned_pkey')
+    for name, columns in INDEXES:
+        op.execute('DROP INDEX %s' % name)
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY NONE')
+    # the partition key has to be part of the primary key
+    op.execute('''
+CREATE TABLE shows (
+  id integer NOT NULL DEFAULT nextval('shows_id_seq'),
+  artist_id integer NOT NULL REFERENCES artists (id) ON DELETE CASCADE,
+  venue_id integer NOT NULL REFERENCES venues (id) ON DELETE CASCADE,
+  start_time timestamp without time zone NOT NULL,
+  PRIMARY KEY (id, start_time)
+) PARTITION BY RANGE (start_time)''')
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY shows.id')
+    for name, columns in INDEXES:
+        op.execute('CREATE INDEX %s ON shows (%s)' % (name, columns))
+    op.execute('CREATE TABLE shows_default PARTITION OF shows DEFAULT')
+
+    # a partition for every month with shows, up to three months ahead
+    first, last = bind.execute(sa.text(
+        'SELECT min(start_time), max(start_time) FROM shows_unpartitioned')
+        ).first()
+    now = dt.datetime.now()
+    month = dt.datetime((first or now).year, (first or now).month, 1)
+    end = max(last or now, now)
+    end = next_month(next_month(next_month(dt.datetime(end.year, end.month,
+                                                       1))))
+    while month <= end:
+        op.execute("CREATE TABLE shows_y%04dm%02d PARTITION OF shows "
+                   "FOR VALUES FROM ('%s') TO ('%s')"
+                   % (month.year, month.month, month, next_month(month)))
+        month = next_month(month)
+    op.execute('INSERT INTO shows (id, artist_id, venue_id, start_time) '
+               'SELECT id, artist_id, venue_id, start_time '
+               'FROM shows_unpartitioned')
+    op.execute('DROP TABLE shows_unpartitioned')
+
+    # detached old months end up here (partitions.py)
+    op.execute('CREATE TABLE shows_archive (LIKE shows INCLUDING DEFAULTS) '
+               'PARTITION BY RANGE (start_time)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('ALTER TABLE shows RENAME TO shows_partitioned')
+    op.execute('ALTER TABLE shows_partitioned '
+               'RENAME CONSTRAINT shows_pkey TO shows_partitioned_pkey')
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY NONE')
+    for name, columns in INDEXES:
+        op.execute('DROP INDEX %s' % name)
+    op.execute('''
+CREATE TABLE shows (
+  id integer NOT NULL DEFAULT nextval('shows_id_seq') PRIMARY KEY,
+  artist_id integer NOT NULL REFERENCES artists (id) ON DELETE CASCADE,
+  venue_id integer NOT NULL REFERENCES venues (id) ON DELETE CASCADE,
+  start_time timestamp without time zone NOT NULL
+)''')
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY shows.id')
+    # archived shows come back too
+    op.execute('INSERT INTO shows SELECT id, artist_id, venue_id, start_time '
+               'FROM shows_partitioned UNION ALL '
+               'SELECT id, artist_id, venue_id, start_time FROM shows_archive')
+    op.execute('DROP TABLE shows_partitioned')
+    op.execute('DROP TABLE shows_archive')
+    for name, columns in INDEXES:
+        op.execute('CREATE INDEX %s ON shows (%s)' % (name, columns))
@@ -0,0 +1,62 @@
+"""add show durations and double-booking constraints
+
+Revision ID: c2e6f8a1d957
+Revises: b5d8e2f0c613
+Create Date: 2026-10-18 16:21:44.907315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e6f8a1d957'
+down_revision = 'b5d8e2f0c613'
+branch_labels = None
+depends_on = None
+
+# kept in step with partitions.OVERLAP_COLUMNS
+OVERLAP_COLUMNS = ['venue_id', 'artist_id']
+LEAF_PARTITIONS = sa.text(
+    "SELECT child.relname FROM pg_inherits "
+    "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+    "WHERE pg_inherits.inhparent IN (CAST('shows' AS regclass), "
+    "CAST('shows_archive' AS regclass))")
+
+
+def upgrade():
+    op.add_column('shows', sa.Column('duration_minutes', sa.Integer(),
+                                     server_default='120', nullable=False))
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    # shows_archive was created LIKE shows and does not inherit from it;
+    # archived months are its partitions and get the column from it
+    op.add_column('shows_archive',
+                  sa.Column('duration_minutes', sa.Integer(),
+                            server_default='120', nullable=False))
+    op.create_check_constraint('ck_shows_duration_minutes', 'shows',
+                               'duration_minutes BETWEEN 1 AND 1440')
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    # a partitioned parent cannot carry them, so every partition does;
+    # this fails if existing shows already overlap
+    for table, in bind.execute(LEAF_PARTITIONS).fetchall():
+        for column in OVERLAP_COLUMNS:
+            op.execute(
+                "ALTER TABLE %s ADD CONSTRAINT %s_%s_overlap EXCLUDE USING "
+                "gist (%s WITH =, tsrange(start_time, start_time + "
+                "duration_minutes * interval '1 minute') WITH &&)"
+                % (table, table, column[:-3], column))
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for table, in bind.execute(LEAF_PARTITIONS).fetchall():
+            for column in OVERLAP_COLUMNS:
+                op.execute('ALTER TABLE %s DROP CONSTRAINT IF EXISTS '
+                           '%s_%s_overlap' % (table, table, column[:-3]))
+        op.drop_constraint('ck_shows_duration_minutes', 'shows')
+        op.drop_column('shows_archive', 'duration_minutes')
+    with op.batch_alter_table('shows') as batch:
+        batch.drop_column('duration_minutes')
@@ -0,0 +1,64 @@
+"""store genres as indexed arrays
+
+Revision ID: c71b0e94d2a8
+Revises: a3e5d2c81f40
+Create Date: 2026-10-18 10:03:17.542961
+
+"""
+import pickle
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c71b0e94d2a8'
+down_revision = 'a3e5d2c81f40'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venues', 'artists')
+BATCH_SIZE = 1000
+
+
+def convert(table, old_type, new_type, convert_value):
+    '''rewrites table.genres through convert_value into a new column type'''
+    bind = op.get_bind()
+    op.add_column(table, sa.Column('genres_new', new_type, nullable=True))
+    source = sa.table(table, sa.column('id'), sa.column('genres', old_type))
+    target = sa.table(table, sa.column('id'), sa.column('genres_new', new_type))
+    rows = bind.execute(sa.select(source.c.id, source.c.genres)).fetchall()
+    update = target.update() \
+        .where(target.c.id == sa.bindparam('row_id')) \
+        .values(genres_new=sa.bindparam('value'))
+    for start in range(0, len(rows), BATCH_SIZE):
+        bind.execute(update, [
+            {'row_id': row_id, 'value': convert_value(genres)}
+            for row_id, genres in rows[start:start + BATCH_SIZE]
+        ])
+    op.drop_column(table, 'genres')
+    op.alter_column(table, 'genres_new', new_column_name='genres',
+                    nullable=False)
+
+
+def to_list(genres):
+    if genres is None:
+        return []
+    if isinstance(genres, str):
+        return [genres]
+    return list(genres)
+
+
+def upgrade():
+    for table in TABLES:
+        convert(table, sa.LargeBinary(), postgresql.ARRAY(sa.String(40)),
+                lambda value: to_list(pickle.loads(value) if value else None))
+        op.create_index('ix_%s_genres' % table, table, ['genres'],
+                        postgresql_using='gin')
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index('ix_%s_genres' % table, table_name=table)
+        convert(table, postgresql.ARRAY(sa.String(40)), sa.LargeBinary(),
+                lambda value: pickle.dumps(to_list(value)))
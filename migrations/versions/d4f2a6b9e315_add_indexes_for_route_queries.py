@@ -0,0 +1,43 @@
+"""add indexes for route queries
+
+Revision ID: d4f2a6b9e315
+Revises: c71b0e94d2a8
+Create Date: 2026-10-18 10:41:52.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f2a6b9e315'
+down_revision = 'c71b0e94d2a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # show_venue / venues(): shows of one venue by start time
+    op.create_index('ix_shows_venue_id_start_time', 'shows',
+                    ['venue_id', 'start_time'])
+    # show_artist: shows of one artist by start time
+    op.create_index('ix_shows_artist_id_start_time', 'shows',
+                    ['artist_id', 'start_time'])
+    # shows(): keyset pagination on (start_time, id)
+    op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'])
+    # venues(): area listing ordered by state, city
+    op.create_index('ix_venues_state_city', 'venues', ['state', 'city', 'id'])
+    # index(): latest 10 venues and artists
+    op.create_index('ix_venues_created_date', 'venues',
+                    [sa.text('created_date DESC')])
+    op.create_index('ix_artists_created_date', 'artists',
+                    [sa.text('created_date DESC')])
+
+
+def downgrade():
+    op.drop_index('ix_artists_created_date', table_name='artists')
+    op.drop_index('ix_venues_created_date', table_name='venues')
+    op.drop_index('ix_venues_state_city', table_name='venues')
+    op.drop_index('ix_shows_start_time_id', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
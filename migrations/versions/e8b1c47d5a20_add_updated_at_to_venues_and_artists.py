@@ -0,0 +1,32 @@
+"""add updated_at to venues and artists
+
+Revision ID: e8b1c47d5a20
+Revises: d4f2a6b9e315
+Create Date: 2026-10-18 11:52:16.318842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b1c47d5a20'
+down_revision = 'd4f2a6b9e315'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(),
+                                       server_default=sa.func.now(),
+                                       nullable=False))
+        # existing rows last changed when they were created, as far as we know
+        op.execute('UPDATE %s SET updated_at = created_date' % table)
+        op.create_index('ix_%s_updated_at' % table, table, ['updated_at'])
+
+
+def downgrade():
+    for table in ('artists', 'venues'):
+        op.drop_index('ix_%s_updated_at' % table, table_name=table)
+        op.drop_column(table, 'updated_at')
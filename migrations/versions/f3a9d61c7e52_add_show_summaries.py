@@ -0,0 +1,48 @@
+"""add show_summaries
+
+Revision ID: f3a9d61c7e52
+Revises: e8b1c47d5a20
+Create Date: 2026-10-18 12:34:05.117930
+
+"""
+import datetime as dt
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9d61c7e52'
+down_revision = 'e8b1c47d5a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'show_summaries',
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('past_count', sa.Integer(), nullable=False),
+        sa.Column('upcoming_count', sa.Integer(), nullable=False),
+        sa.Column('next_show_time', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('kind', 'entity_id')
+    )
+    op.create_index(op.f('ix_show_summaries_next_show_time'),
+                    'show_summaries', ['next_show_time'])
+    # same counts as summaries.rebuild()
+    for kind in ('venue', 'artist'):
+        op.get_bind().execute(sa.text(
+            "INSERT INTO show_summaries (kind, entity_id, past_count, "
+            "upcoming_count, next_show_time) "
+            "SELECT :kind, {0}_id, "
+            "count(CASE WHEN start_time <= :now THEN id END), "
+            "count(CASE WHEN start_time > :now THEN id END), "
+            "min(CASE WHEN start_time > :now THEN start_time END) "
+            "FROM shows GROUP BY {0}_id".format(kind)),
+            kind=kind, now=dt.datetime.now())
+
+
+def downgrade():
+    op.drop_index(op.f('ix_show_summaries_next_show_time'),
+                  table_name='show_summaries')
+    op.drop_table('show_summaries')
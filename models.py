@@ -1,18 +1,32 @@
 from email.policy import default
+from sqlalchemy import DDL, exists, select
+from sqlalchemy.dialects import postgresql
 from app import db
+from forms import Genres
 import datetime as dt
 
+# genres are stored as a list of forms.Genres names: a text[] with a GIN
+# index on PostgreSQL, JSON on SQLite test databases
+GenreList = postgresql.ARRAY(db.String(40)).with_variant(db.JSON, 'sqlite')
+
 
 class Venue(db.Model):
     '''defines the venue model'''
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venues_state_city', 'state', 'city', 'id'),
+        db.Index('ix_venues_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     address = db.Column(db.String(120))
-    genres = db.Column(db.PickleType, nullable=False)
+    genres = db.Column(GenreList, nullable=False)
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500), nullable=False)
     facebook_link = db.Column(db.String(120))
@@ -21,6 +35,10 @@ class Venue(db.Model):
     seeking_description = db.Column(db.String(500), nullable=False)
     created_date = db.Column(db.DateTime, nullable=False,
                              default=dt.datetime.now())
+    # bumped by every change to what the venue page shows, see touch()
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=dt.datetime.now, onupdate=dt.datetime.now,
+                           server_default=db.func.now())
     shows = db.relationship('Show', backref='venue',
                             lazy="dynamic", cascade="all, delete")
 
@@ -28,13 +46,19 @@ class Venue(db.Model):
 class Artist(db.Model):
     '''defines the artist model'''
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artists_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
-    genres = db.Column(db.PickleType, nullable=False)
+    genres = db.Column(GenreList, nullable=False)
     image_link = db.Column(db.String(500), nullable=False)
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
@@ -42,13 +66,34 @@ class Artist(db.Model):
     seeking_description = db.Column(db.String(500), nullable=False)
     created_date = db.Column(db.DateTime, nullable=False,
                              default=dt.datetime.now())
+    # bumped by every change to what the artist page shows, see touch()
+    updated_at = db.Column(db.DateTime, nullable=False,
+                           default=dt.datetime.now, onupdate=dt.datetime.now,
+                           server_default=db.func.now())
     shows = db.relationship('Show', backref='artist',
                             lazy="dynamic", cascade="all, delete")
 
 
+# shows last duration_minutes; the cap bounds how far back an overlapping
+# show can start (see schedule.py)
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 24 * 60
+
+
 class Show(db.Model):
     '''defines the show model'''
+    # on PostgreSQL the table is partitioned by month of start_time, with
+    # (id, start_time) as its primary key and exclusion constraints against
+    # double bookings on every partition; see partitions.py
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        db.CheckConstraint('duration_minutes BETWEEN 1 AND %d'
+                           % MAX_SHOW_MINUTES,
+                           name='ck_shows_duration_minutes'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer,
@@ -58,3 +103,139 @@ class Show(db.Model):
                          db.ForeignKey('venues.id', ondelete="CASCADE"),
                          nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False,
+                                 default=DEFAULT_SHOW_MINUTES,
+                                 server_default=str(DEFAULT_SHOW_MINUTES))
+
+    @property
+    def end_time(self):
+        return self.start_time + dt.timedelta(minutes=self.duration_minutes)
+
+
+class ShowSummary(db.Model):
+    '''past/upcoming show counts of one venue or artist, see summaries.py'''
+    __tablename__ = 'show_summaries'
+
+    kind = db.Column(db.String(10), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    past_count = db.Column(db.Integer, nullable=False, default=0)
+    upcoming_count = db.Column(db.Integer, nullable=False, default=0)
+    next_show_time = db.Column(db.DateTime, index=True)
+
+
+# home page "latest 10" listings
+db.Index('ix_venues_created_date', Venue.created_date.desc())
+db.Index('ix_artists_created_date', Artist.created_date.desc())
+
+# /search on PostgreSQL: a weighted tsvector of name (A), city and state (B)
+# and genres (C), kept current by a trigger so COPY and raw SQL writes are
+# covered too. Not mapped; search.py refers to it by name.
+SEARCH_VECTOR_FUNCTION = '''
+CREATE OR REPLACE FUNCTION catalog_search_vector() RETURNS trigger AS $$
+BEGIN
+  NEW.search_vector :=
+    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' ||
+                                    coalesce(NEW.state, '')), 'B') ||
+    setweight(to_tsvector('simple', replace(
+      array_to_string(NEW.genres, ' '), '_', ' ')), 'C');
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+'''
+SEARCH_VECTOR_DDL = [
+    'ALTER TABLE %(table)s ADD COLUMN search_vector tsvector',
+    'CREATE TRIGGER %(table)s_search_vector '
+    'BEFORE INSERT OR UPDATE OF name, city, state, genres ON %(table)s '
+    'FOR EACH ROW EXECUTE PROCEDURE catalog_search_vector()',
+    'CREATE INDEX ix_%(table)s_search_vector ON %(table)s '
+    'USING gin (search_vector)',
+]
+
+# pg_trgm for the gin_trgm_ops name indexes, btree_gist for the double
+# booking exclusion constraints of the shows partitions (partitions.py)
+EXTENSIONS = ['pg_trgm', 'btree_gist']
+
+for extension in EXTENSIONS:
+    db.event.listen(db.metadata, 'before_create',
+                    DDL('CREATE EXTENSION IF NOT EXISTS %s' % extension)
+                    .execute_if(dialect='postgresql'))
+db.event.listen(db.metadata, 'before_create', DDL(SEARCH_VECTOR_FUNCTION)
+                .execute_if(dialect='postgresql'))
+for model in (Venue, Artist):
+    for statement in SEARCH_VECTOR_DDL:
+        db.event.listen(model.__table__, 'after_create', DDL(statement)
+                        .execute_if(dialect='postgresql'))
+
+
+def touch(connection, model, ids=None):
+    '''bumps updated_at of the given venues or artists (all when ids is None)
+
+    ids may be a list or a select of ids. Bulk inserts skip the mapper
+    events below and must call this themselves.
+    '''
+    statement = model.__table__.update() \
+        .values(updated_at=dt.datetime.now())
+    if ids is not None:
+        statement = statement.where(model.id.in_(ids))
+    connection.execute(statement)
+
+
+@db.event.listens_for(Show, 'after_insert')
+def touch_show_pages(mapper, connection, show):
+    '''a show is listed on its venue's and its artist's pages'''
+    touch(connection, Venue, [show.venue_id])
+    touch(connection, Artist, [show.artist_id])
+
+
+@db.event.listens_for(Show, 'after_delete')
+def remember_deleted_show(mapper, connection, show):
+    '''deleting a venue or an artist cascades to its shows one at a time,
+    so their pages are touched once per flush (see summaries.py)'''
+    pages = db.inspect(show).session.info.setdefault(
+        'deleted_show_pages', {"venue": set(), "artist": set()})
+    pages['venue'].add(show.venue_id)
+    pages['artist'].add(show.artist_id)
+
+
+def deleted_show_pages(session):
+    '''pops {kind: ids} of the venues and artists that lost shows'''
+    return session.info.pop('deleted_show_pages', {})
+
+
+@db.event.listens_for(Venue, 'after_update')
+def touch_venue_artists(mapper, connection, venue):
+    '''artist pages show the name and image of the venues they play'''
+    if listed_fields_changed(venue):
+        touch(connection, Artist,
+              select(Show.artist_id).where(Show.venue_id == venue.id))
+
+
+@db.event.listens_for(Artist, 'after_update')
+def touch_artist_venues(mapper, connection, artist):
+    '''venue pages show the name and image of the artists they host'''
+    if listed_fields_changed(artist):
+        touch(connection, Venue,
+              select(Show.venue_id).where(Show.artist_id == artist.id))
+
+
+def listed_fields_changed(entity):
+    state = db.inspect(entity)
+    return any(state.attrs[name].history.has_changes()
+               for name in ('name', 'image_link'))
+
+
+def genre_name(genre):
+    '''maps a genre name or label (e.g. Hip-Hop) to its forms.Genres name'''
+    for member in Genres:
+        if genre in (member.name, member.value):
+            return member.name
+    return None
+
+
+def has_genre(session, column, genre):
+    '''filter clause matching rows whose genres column contains genre'''
+    if session.bind.dialect.name == 'postgresql':
+        return column.contains([genre])
+    values = db.func.json_each(column).table_valued('value')
+    return exists().where(values.c.value == genre)
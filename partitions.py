@@ -0,0 +1,208 @@
+'''monthly partitions of the shows table on PostgreSQL
+
+    flask partition-shows [--ahead 3] [--archive-before 2023-01-01]
+
+shows is range-partitioned by start_time, one partition per month
+(shows_y2026m10) plus shows_default for anything outside them, so queries
+on a time window (upcoming shows, the calendar) only scan the months they
+cover. The command creates the partitions for the current month and the
+--ahead months after it, moving rows out of shows_default where needed,
+and with --archive-before detaches every month that ended before that date
+from shows and attaches it to shows_archive. Archived shows drop out of the
+site, and the show summaries are recounted.
+
+SQLite databases keep a single unpartitioned shows table. On PostgreSQL
+db.create_all() creates the same partitioned layout as the migrations.
+'''
+import datetime as dt
+import re
+import click
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+from app import app, db, page_cache
+from models import Venue, Artist, Show, touch
+import summaries
+
+# no two shows in a partition may overlap at the same venue or artist
+OVERLAP_COLUMNS = ['venue_id', 'artist_id']
+NAME = re.compile(r'^shows_y(\d{4})m(\d{2})$')
+PARTITIONS = text(
+    "SELECT child.relname FROM pg_inherits "
+    "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+    "WHERE pg_inherits.inhparent = CAST(:parent AS regclass)")
+
+# db.create_all() makes shows a plain table; on PostgreSQL it is rebuilt,
+# still empty, with the layout migration b5d8e2f0c613 gives it: partitioned
+# by start_time with it in the primary key, shows_default and the archive
+PARTITIONED_DDL = [
+    'ALTER SEQUENCE shows_id_seq OWNED BY NONE',
+    'CREATE TABLE shows_partitioned ('
+    'LIKE shows INCLUDING DEFAULTS INCLUDING CONSTRAINTS, '
+    'PRIMARY KEY (id, start_time), '
+    'CONSTRAINT shows_artist_id_fkey FOREIGN KEY (artist_id) '
+    'REFERENCES artists (id) ON DELETE CASCADE, '
+    'CONSTRAINT shows_venue_id_fkey FOREIGN KEY (venue_id) '
+    'REFERENCES venues (id) ON DELETE CASCADE'
+    ') PARTITION BY RANGE (start_time)',
+    'DROP TABLE shows',
+    'ALTER TABLE shows_partitioned RENAME TO shows',
+    'ALTER TABLE shows '
+    'RENAME CONSTRAINT shows_partitioned_pkey TO shows_pkey',
+    'ALTER SEQUENCE shows_id_seq OWNED BY shows.id',
+    'CREATE TABLE shows_default PARTITION OF shows DEFAULT',
+    'CREATE TABLE shows_archive (LIKE shows INCLUDING DEFAULTS) '
+    'PARTITION BY RANGE (start_time)',
+]
+
+
+def month_start(value):
+    return dt.datetime(value.year, value.month, 1)
+
+
+def next_month(month):
+    return dt.datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return 'shows_y%04dm%02d' % (month.year, month.month)
+
+
+def partition_months(connection, parent='shows'):
+    '''{first day of month: partition name} of parent's monthly partitions'''
+    months = {}
+    for name, in connection.execute(PARTITIONS, {"parent": parent}):
+        match = NAME.match(name)
+        if match:
+            months[dt.datetime(int(match.group(1)), int(match.group(2)),
+                               1)] = name
+    return months
+
+
+def add_overlap_constraints(connection, name):
+    '''exclusion constraints against double bookings on one partition
+
+    PostgreSQL only accepts them on the partitioned parent when they compare
+    the partition key with =, so each month enforces them for its own rows.
+    Shows straddling midnight at the end of a month are only checked in
+    process (schedule.py).
+    '''
+    for column in OVERLAP_COLUMNS:
+        connection.execute(text(
+            "ALTER TABLE %s ADD CONSTRAINT %s_%s_overlap EXCLUDE USING gist "
+            "(%s WITH =, tsrange(start_time, start_time + "
+            "duration_minutes * interval '1 minute') WITH &&)"
+            % (name, name, column[:-3], column)))
+
+
+def create_partition(connection, month):
+    '''adds the partition of one month, taking its rows from shows_default'''
+    bounds = {"start": month, "end": next_month(month)}
+    name = partition_name(month)
+    moved = connection.execute(text(
+        'SELECT count(*) FROM shows_default '
+        'WHERE start_time >= :start AND start_time < :end'), bounds).scalar()
+    if not moved:
+        connection.execute(text(
+            "CREATE TABLE %s PARTITION OF shows "
+            "FOR VALUES FROM ('%s') TO ('%s')"
+            % (name, bounds['start'], bounds['end'])))
+        add_overlap_constraints(connection, name)
+        return 0
+    connection.execute(text(
+        'CREATE TABLE %s (LIKE shows INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        % name))
+    connection.execute(text(
+        'WITH moved AS (DELETE FROM shows_default '
+        'WHERE start_time >= :start AND start_time < :end RETURNING *) '
+        'INSERT INTO %s SELECT * FROM moved' % name), bounds)
+    add_overlap_constraints(connection, name)
+    connection.execute(text(
+        "ALTER TABLE shows ATTACH PARTITION %s "
+        "FOR VALUES FROM ('%s') TO ('%s')"
+        % (name, bounds['start'], bounds['end'])))
+    return moved
+
+
+@db.event.listens_for(Show.__table__, 'after_create')
+def partition_created_shows(table, connection, **kw):
+    if connection.dialect.name != 'postgresql':
+        return
+    for statement in PARTITIONED_DDL:
+        connection.execute(text(statement))
+    for index in table.indexes:
+        connection.execute(CreateIndex(index))
+    add_overlap_constraints(connection, 'shows_default')
+
+
+@db.event.listens_for(Show.__table__, 'before_drop')
+def drop_archive(table, connection, **kw):
+    '''shows_archive is not in the metadata; it goes with shows'''
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('DROP TABLE IF EXISTS shows_archive'))
+
+
+def is_partitioned(connection):
+    return connection.execute(text(
+        "SELECT relkind = 'p' FROM pg_class "
+        "WHERE oid = to_regclass('shows')")).scalar() or False
+
+
+def ensure_partitions(connection, ahead=3, now=None):
+    '''creates the missing partitions up to `ahead` months from now
+
+    Returns the names created and the number of rows they took over.
+    '''
+    existing = partition_months(connection)
+    month = month_start(now or dt.datetime.now())
+    created, moved = [], 0
+    for _ in range(ahead + 1):
+        if month not in existing:
+            moved += create_partition(connection, month)
+            created.append(partition_name(month))
+        month = next_month(month)
+    return created, moved
+
+
+def archive_partitions(connection, before):
+    '''moves the months ending on or before `before` to shows_archive'''
+    archived = []
+    for month, name in sorted(partition_months(connection).items()):
+        if next_month(month) > before:
+            break
+        connection.execute(text('ALTER TABLE shows DETACH PARTITION %s'
+                                % name))
+        connection.execute(text(
+            "ALTER TABLE shows_archive ATTACH PARTITION %s "
+            "FOR VALUES FROM ('%s') TO ('%s')"
+            % (name, month, next_month(month))))
+        archived.append(name)
+    return archived
+
+
+@app.cli.command('partition-shows')
+@click.option('--ahead', default=3, show_default=True,
+              help='Months after the current one to create partitions for.')
+@click.option('--archive-before', type=click.DateTime(['%Y-%m-%d']),
+              help='Archive every month that ends on or before this date.')
+def partition_shows_command(ahead, archive_before):
+    '''Create upcoming shows partitions and archive old ones.'''
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        click.echo('shows is only partitioned on PostgreSQL; nothing to do')
+        return
+    if not is_partitioned(connection):
+        raise click.ClickException(
+            'shows is not a partitioned table; run flask db upgrade, or '
+            'recreate the schema with db.create_all()')
+    created, moved = ensure_partitions(connection, ahead)
+    click.echo('created %s (%d rows moved from shows_default)'
+               % (', '.join(created) or 'no partitions', moved))
+    if archive_before:
+        archived = archive_partitions(connection, archive_before)
+        if archived:
+            summaries.rebuild(db.session)
+            touch(connection, Venue)
+            touch(connection, Artist)
+        click.echo('archived %s' % (', '.join(archived) or 'nothing'))
+    db.session.commit()
+    page_cache.clear()
@@ -0,0 +1,387 @@
+'''read queries shared by the HTML views and the JSON API
+
+Every function takes the session to run on and returns plain dicts and
+lists, so the same query work backs both the templates and the API.
+'''
+import datetime as dt
+from sqlalchemy import desc, func, case, tuple_, or_, and_
+from sqlalchemy.orm import contains_eager
+from models import Venue, Artist, Show, ShowSummary, has_genre
+
+
+def latest(session, model, limit=10):
+    '''the most recently created venues or artists'''
+    rows = session.query(model.id, model.name) \
+        .order_by(desc(model.created_date)).limit(limit).all()
+    return [{"id": row.id, "name": row.name} for row in rows]
+
+
+def venue_areas(session, genre=None):
+    '''venues grouped by city and state with their upcoming show counts'''
+    query = session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state,
+        func.coalesce(ShowSummary.upcoming_count, 0)
+        .label('num_upcoming_shows')
+      ).outerjoin(ShowSummary, and_(ShowSummary.kind == 'venue',
+                                    ShowSummary.entity_id == Venue.id))
+    if genre:
+        query = query.filter(has_genre(session, Venue.genres, genre))
+    venues = query.order_by(Venue.state, Venue.city, Venue.id).all()
+    data = []
+    city_state = None
+
+    for venue in venues:
+        details = {
+          "id": venue.id,
+          "name": venue.name,
+          "num_upcoming_shows": venue.num_upcoming_shows
+        }
+        if city_state == (venue.city, venue.state):
+            data[-1]['venues'].append(details)
+        else:
+            city_state = (venue.city, venue.state)
+            data.append({
+              "city": venue.city,
+              "state": venue.state,
+              "venues": [details]
+            })
+    return data
+
+
+def artist_list(session, genre=None):
+    '''id and name of every artist'''
+    query = session.query(Artist.id, Artist.name)
+    if genre:
+        query = query.filter(has_genre(session, Artist.genres, genre))
+    return [{"id": row.id, "name": row.name} for row in query]
+
+
+def search_results(session, kind, matches):
+    '''shapes search service matches for the search templates'''
+    upcoming = upcoming_counts(session, kind, [match.id for match in matches])
+    return {
+      "count": len(matches),
+      "data": [{
+        "id": match.id,
+        "name": match.name,
+        "num_upcoming_shows": upcoming.get(match.id, 0)
+      } for match in matches]
+    }
+
+
+def catalog_results(session, hits):
+    '''shapes catalog search hits for the /search page and API'''
+    upcoming = {kind: upcoming_counts(session, kind,
+                                      [hit.id for hit in hits
+                                       if hit.kind == kind])
+                for kind in ('venue', 'artist')}
+    return {
+      "count": len(hits),
+      "data": [{
+        "kind": hit.kind,
+        "id": hit.id,
+        "name": hit.name,
+        "city": hit.city,
+        "state": hit.state,
+        "num_upcoming_shows": upcoming[hit.kind].get(hit.id, 0)
+      } for hit in hits]
+    }
+
+
+def upcoming_counts(session, kind, ids):
+    '''{id: upcoming show count} of the given venue or artist ids'''
+    if not ids:
+        return {}
+    return dict(session.query(ShowSummary.entity_id,
+                              ShowSummary.upcoming_count)
+                .filter(ShowSummary.kind == kind,
+                        ShowSummary.entity_id.in_(ids)))
+
+
+def show_counts(session, kind, entity_id, now):
+    '''(past, upcoming) show counts of one venue or artist
+
+    None when one of its shows has started since the last rollover, which
+    leaves the stored counts out of date.
+    '''
+    summary = session.query(ShowSummary).get((kind, entity_id))
+    if summary is None:
+        return 0, 0
+    if summary.next_show_time is not None and summary.next_show_time <= now:
+        return None
+    return summary.past_count, summary.upcoming_count
+
+
+def entity_shows(session, column, entity_id, counterpart):
+    '''shows of one venue or artist with their counterpart loaded'''
+    return session.query(Show) \
+      .join(counterpart).options(contains_eager(counterpart)) \
+      .filter(column == entity_id) \
+      .order_by(Show.start_time).all()
+
+
+def split_shows(shows, counts, now, details):
+    '''splits shows into past and upcoming in a single pass
+
+    counts are the summary's (past, upcoming) counts; when they are out of
+    date the lengths of the two lists are used instead.
+    '''
+    past_shows = []
+    upcoming_shows = []
+
+    for show in shows:
+        if show.start_time < now:
+            past_shows.append(details(show))
+        elif show.start_time > now:
+            upcoming_shows.append(details(show))
+    past_shows_count, upcoming_shows_count = \
+        counts or (len(past_shows), len(upcoming_shows))
+    return {
+      "past_shows": past_shows,
+      "upcoming_shows": upcoming_shows,
+      "past_shows_count": past_shows_count,
+      "upcoming_shows_count": upcoming_shows_count
+    }
+
+
+def venue_detail(session, venue_id, now=None):
+    '''venue page data, or None if there is no such venue'''
+    venue = session.query(Venue).get(venue_id)
+    if venue is None:
+        return None
+    now = now or dt.datetime.now()
+    shows = entity_shows(session, Show.venue_id, venue_id, Show.artist)
+    counts = show_counts(session, 'venue', venue_id, now)
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres,
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "image_link": venue.image_link,
+        "updated_at": venue.updated_at,
+    }
+    data.update(split_shows(shows, counts, now, lambda show: {
+      "artist_id": show.artist_id,
+      "artist_name": show.artist.name,
+      "artist_image_link": show.artist.image_link,
+      "start_time": show.start_time
+    }))
+    return data
+
+
+def artist_detail(session, artist_id, now=None):
+    '''artist page data, or None if there is no such artist'''
+    artist = session.query(Artist).get(artist_id)
+    if artist is None:
+        return None
+    now = now or dt.datetime.now()
+    shows = entity_shows(session, Show.artist_id, artist_id, Show.venue)
+    counts = show_counts(session, 'artist', artist_id, now)
+    data = {
+      "id": artist.id,
+      "name": artist.name,
+      "genres": artist.genres,
+      "city": artist.city,
+      "state": artist.state,
+      "phone": artist.phone,
+      "seeking_venue": artist.seeking_venue,
+      "seeking_description": artist.seeking_description,
+      "website": artist.website_link,
+      "facebook_link": artist.facebook_link,
+      "image_link": artist.image_link,
+      "updated_at": artist.updated_at,
+    }
+    data.update(split_shows(shows, counts, now, lambda show: {
+      "venue_id": show.venue_id,
+      "venue_name": show.venue.name,
+      "venue_image_link": show.venue.image_link,
+      "start_time": show.start_time
+    }))
+    return data
+
+
+def entity_version(session, model, column, entity_id, now=None):
+    '''when one venue or artist page last changed, None if it is missing
+
+    That is the later of its updated_at and the start of its latest show
+    that has already begun, since a show moves from upcoming to past then.
+    '''
+    now = now or dt.datetime.now()
+    started = session.query(func.max(Show.start_time)) \
+        .filter(column == entity_id, Show.start_time <= now) \
+        .scalar_subquery()
+    row = session.query(model.updated_at, started) \
+        .filter(model.id == entity_id).first()
+    if row is None:
+        return None
+    return max(stamp for stamp in row if stamp is not None)
+
+
+def catalog_version(session, now=None):
+    '''(venue count, artist count, last change) for the listing pages
+
+    Counts catch deletes; the last change is the latest updated_at of any
+    venue or artist, or show start that has already begun.
+    '''
+    now = now or dt.datetime.now()
+    row = session.query(
+        session.query(func.count(Venue.id)).scalar_subquery(),
+        session.query(func.count(Artist.id)).scalar_subquery(),
+        session.query(func.max(Venue.updated_at)).scalar_subquery(),
+        session.query(func.max(Artist.updated_at)).scalar_subquery(),
+        session.query(func.max(Show.start_time))
+        .filter(Show.start_time <= now).scalar_subquery()
+      ).one()
+    stamps = [stamp for stamp in row[2:] if stamp is not None]
+    return row[0], row[1], max(stamps) if stamps else dt.datetime.fromtimestamp(0)
+
+
+def show_details(show):
+    return {
+      "id": show.id,
+      "venue_id": show.venue_id,
+      "venue_name": show.venue.name,
+      "artist_id": show.artist_id,
+      "artist_name": show.artist.name,
+      "artist_image_link": show.artist.image_link,
+      "start_time": show.start_time,
+      "duration_minutes": show.duration_minutes,
+      "updated_at": max(show.venue.updated_at, show.artist.updated_at)
+    }
+
+
+def shows_query(session, date_from=None, date_to=None):
+    '''shows with their venue and artist loaded, optionally by date range'''
+    query = session.query(Show).join(Show.venue).join(Show.artist) \
+        .options(contains_eager(Show.venue), contains_eager(Show.artist))
+    if date_from:
+        query = query.filter(Show.start_time >= date_from)
+    if date_to:
+        query = query.filter(Show.start_time < date_to + dt.timedelta(days=1))
+    return query
+
+
+def show_calendar(session, date_from, date_to, city=None, state=None):
+    '''shows between two dates (inclusive) bucketed by day, in one query
+
+    Every day of the range is listed, with an empty list when nothing is on.
+    '''
+    query = shows_query(session, date_from, date_to)
+    if city:
+        query = query.filter(func.lower(Venue.city) == city.lower())
+    if state:
+        query = query.filter(Venue.state == state)
+    days = {}
+    day = date_from.date()
+    while day <= date_to.date():
+        days[day] = []
+        day += dt.timedelta(days=1)
+    for show in query.order_by(Show.start_time, Show.id):
+        days[show.start_time.date()].append(show_details(show))
+    return [{"date": day, "shows": shows} for day, shows in days.items()]
+
+
+def show_page(session, per_page, date_from=None, date_to=None,
+              after=None, before=None):
+    '''one keyset page of shows ordered by (start_time, id)
+
+    after and before are (start_time, id) positions. Returns the page and
+    whether later and earlier pages exist.
+    '''
+    query = shows_query(session, date_from, date_to)
+    if before:
+        query = query.filter(tuple_(Show.start_time, Show.id) <
+                             tuple_(*before)) \
+            .order_by(desc(Show.start_time), desc(Show.id))
+    else:
+        if after:
+            query = query.filter(tuple_(Show.start_time, Show.id) >
+                                 tuple_(*after))
+        query = query.order_by(Show.start_time, Show.id)
+
+    shows = query.limit(per_page + 1).all()
+    has_more = len(shows) > per_page
+    shows = shows[:per_page]
+    if before:
+        shows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, bool(after)
+    return [show_details(show) for show in shows], has_next, has_prev
+
+
+def show_detail(session, show_id):
+    '''one show, or None if there is no such show'''
+    show = shows_query(session).filter(Show.id == show_id).first()
+    return show_details(show) if show else None
+
+
+def search_shows(session, venue_ids, artist_ids, limit=100):
+    '''upcoming shows at the given venues or by the given artists'''
+    if not venue_ids and not artist_ids:
+        return []
+    shows = shows_query(session, date_from=dt.datetime.now()) \
+        .filter(or_(Show.venue_id.in_(venue_ids),
+                    Show.artist_id.in_(artist_ids))) \
+        .order_by(Show.start_time, Show.id).limit(limit)
+    return [show_details(show) for show in shows]
+
+
+def iter_rows(query, details, batch=1000):
+    '''streams a query from a server-side cursor, one dict at a time'''
+    for row in query.yield_per(batch):
+        yield details(row)
+
+
+def venue_row(venue):
+    return {
+      "id": venue.id,
+      "name": venue.name,
+      "genres": venue.genres,
+      "address": venue.address,
+      "city": venue.city,
+      "state": venue.state,
+      "phone": venue.phone,
+      "image_link": venue.image_link,
+      "seeking_talent": venue.seeking_talent
+    }
+
+
+def artist_row(artist):
+    return {
+      "id": artist.id,
+      "name": artist.name,
+      "genres": artist.genres,
+      "city": artist.city,
+      "state": artist.state,
+      "phone": artist.phone,
+      "image_link": artist.image_link,
+      "seeking_venue": artist.seeking_venue
+    }
+
+
+def iter_venues(session, genre=None):
+    query = session.query(Venue).order_by(Venue.id)
+    if genre:
+        query = query.filter(has_genre(session, Venue.genres, genre))
+    return iter_rows(query, venue_row)
+
+
+def iter_artists(session, genre=None):
+    query = session.query(Artist).order_by(Artist.id)
+    if genre:
+        query = query.filter(has_genre(session, Artist.genres, genre))
+    return iter_rows(query, artist_row)
+
+
+def iter_shows(session, date_from=None, date_to=None):
+    query = shows_query(session, date_from, date_to) \
+        .order_by(Show.start_time, Show.id)
+    return iter_rows(query, show_details)
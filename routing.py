@@ -0,0 +1,155 @@
+'''read-replica routing for db.session
+
+With SQLALCHEMY_REPLICA_URIS set in config.py, the queries of GET and HEAD
+requests go to the replicas: one per request, picked round-robin, skipping
+any replica that failed its last health check. The primary
+(SQLALCHEMY_DATABASE_URI) gets everything else: flushes and DML, reads in
+a request that has already written, reads outside a request (CLI
+commands), and every read from a
+client for REPLICA_READ_YOUR_WRITES_SECONDS after one of its requests
+wrote, so the page a POST redirects to shows the new data while the
+replicas catch up.
+
+Replicas are checked every REPLICA_CHECK_SECONDS (and retried every
+REPLICA_RETRY_SECONDS once down) from the request that picks them; a
+connection error also marks a replica down. With no healthy replica, reads
+fall back to the primary.
+'''
+import itertools
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, exc, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+
+READ_METHODS = ('GET', 'HEAD')
+PRIMARY_COOKIE = 'read_primary'
+LAG_QUERY = text('SELECT extract(epoch FROM '
+                 'now() - pg_last_xact_replay_timestamp())')
+
+
+class Replica:
+    '''one replica engine and the result of its last health check'''
+
+    def __init__(self, uri, options):
+        self.uri = uri
+        self.engine = create_engine(uri, **options)
+        self.healthy = True
+        self.checked = 0.0
+        event.listen(self.engine, 'handle_error', self.handle_error)
+
+    def check(self, max_lag=None):
+        '''pings the replica, and checks its replay lag on PostgreSQL'''
+        try:
+            with self.engine.connect() as connection:
+                if max_lag and self.engine.dialect.name == 'postgresql':
+                    lag = connection.execute(LAG_QUERY).scalar()
+                    self.healthy = lag is None or lag <= max_lag
+                else:
+                    connection.execute(text('SELECT 1'))
+                    self.healthy = True
+        except exc.DBAPIError:
+            self.healthy = False
+        self.checked = time.monotonic()
+
+    def handle_error(self, context):
+        if context.is_disconnect or \
+                isinstance(context.original_exception,
+                           context.engine.dialect.dbapi.OperationalError):
+            self.healthy = False
+            self.checked = time.monotonic()
+
+
+class ReplicaRouter:
+    '''round-robin over the healthy replicas of SQLALCHEMY_REPLICA_URIS'''
+
+    def __init__(self, app):
+        self.app = app
+        self.replicas = []
+        self._configured_for = None
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def configure(self):
+        '''(re)creates the replica engines when the config changes'''
+        uris = tuple(self.app.config.get('SQLALCHEMY_REPLICA_URIS') or ())
+        with self._lock:
+            if uris != self._configured_for:
+                for replica in self.replicas:
+                    replica.engine.dispose()
+                options = self.app.config.get('SQLALCHEMY_ENGINE_OPTIONS') \
+                    or {}
+                self.replicas = [Replica(uri, options) for uri in uris]
+                self._configured_for = uris
+            return self.replicas
+
+    def pick(self):
+        '''the next healthy replica's engine, or None for the primary'''
+        replicas = self.configure()
+        config = self.app.config
+        for _ in range(len(replicas)):
+            replica = replicas[next(self._turn) % len(replicas)]
+            interval = config['REPLICA_CHECK_SECONDS'] if replica.healthy \
+                else config['REPLICA_RETRY_SECONDS']
+            if time.monotonic() - replica.checked >= interval:
+                replica.check(config.get('REPLICA_MAX_LAG_SECONDS'))
+            if replica.healthy:
+                return replica.engine
+        return None
+
+
+def reads_from_replica():
+    '''whether the current request may read from a replica'''
+    return has_request_context() and request.method in READ_METHODS and \
+        PRIMARY_COOKIE not in request.cookies and not g.get('db_wrote')
+
+
+class RoutingSession(SignallingSession):
+    '''SignallingSession sending GET request reads to a replica'''
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, UpdateBase) or \
+                not reads_from_replica():
+            return super().get_bind(mapper, clause)
+        # one replica per request, so its reads (an ETag and the page it
+        # describes) all see the same replication state
+        if 'db_replica' not in g:
+            g.db_replica = self.app.extensions['replica_router'].pick()
+        return g.db_replica or super().get_bind(mapper, clause)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def remember_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_commit(session):
+    '''counts commits of writing requests too: Core inserts and updates
+    (bulk show inserts, touch(), the show summaries) never flush'''
+    if has_request_context() and request.method not in READ_METHODS:
+        g.db_wrote = True
+
+
+def read_your_writes(response):
+    '''sends the client's reads to the primary for a while after a write'''
+    if g.get('db_wrote'):
+        response.set_cookie(
+            PRIMARY_COOKIE, '1', httponly=True,
+            max_age=current_app.config['REPLICA_READ_YOUR_WRITES_SECONDS'])
+    return response
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    '''SQLAlchemy whose db.session routes reads to the replicas'''
+
+    def init_app(self, app):
+        super().init_app(app)
+        app.extensions['replica_router'] = ReplicaRouter(app)
+        app.after_request(read_your_writes)
+
+    def create_session(self, options):
+        return sessionmaker(class_=RoutingSession, db=self, **options)
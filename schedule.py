@@ -0,0 +1,132 @@
+'''double-booking checks for venues and artists
+
+A venue or an artist can only be at one show at a time: a show occupies
+[start_time, start_time + duration_minutes) and must not overlap another
+show at the same venue or by the same artist.
+
+On PostgreSQL every shows partition carries exclusion constraints that
+enforce this (see partitions.py). Elsewhere, and to report every conflict
+of a batch before anything is written, shows are checked in process
+against a Schedule holding the stored shows they could collide with.
+'''
+import bisect
+import datetime as dt
+from sqlalchemy import or_
+from models import Show, DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+
+MAX_LENGTH = dt.timedelta(minutes=MAX_SHOW_MINUTES)
+EXCLUSION_VIOLATION = '23P01'
+
+
+class IntervalIndex:
+    '''half-open intervals per key, kept sorted by start
+
+    No interval is longer than max_length, so the ones overlapping
+    [start, end) all start within (start - max_length, end) and two
+    bisections find them without scanning the rest of the key's list.
+    '''
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+        self.starts = {}
+        self.entries = {}
+
+    def add(self, key, start, end, item=None):
+        starts = self.starts.setdefault(key, [])
+        position = bisect.bisect_right(starts, start)
+        starts.insert(position, start)
+        self.entries.setdefault(key, []).insert(position, (end, item))
+
+    def overlapping(self, key, start, end):
+        '''items whose interval under key overlaps [start, end)'''
+        starts = self.starts.get(key)
+        if not starts:
+            return []
+        entries = self.entries[key]
+        low = bisect.bisect_right(starts, start - self.max_length)
+        high = bisect.bisect_left(starts, end)
+        return [entries[position][1] for position in range(low, high)
+                if entries[position][0] > start]
+
+
+def end_time(show):
+    return show['start_time'] + dt.timedelta(
+        minutes=show.get('duration_minutes') or DEFAULT_SHOW_MINUTES)
+
+
+class Schedule:
+    '''venue and artist bookings that new shows must not overlap'''
+
+    def __init__(self):
+        self.venues = IntervalIndex(MAX_LENGTH)
+        self.artists = IntervalIndex(MAX_LENGTH)
+
+    def load(self, session, shows):
+        '''adds the stored shows that could overlap shows'''
+        if not shows:
+            return self
+        return self.load_window(
+            session, min(show['start_time'] for show in shows),
+            max(end_time(show) for show in shows),
+            {show['venue_id'] for show in shows},
+            {show['artist_id'] for show in shows})
+
+    def load_window(self, session, start, end, venue_ids=None,
+                    artist_ids=None):
+        '''adds the stored shows overlapping [start, end), optionally only
+        those at venue_ids or by artist_ids'''
+        query = session.query(Show.id, Show.venue_id, Show.artist_id,
+                              Show.start_time, Show.duration_minutes) \
+            .filter(Show.start_time > start - MAX_LENGTH,
+                    Show.start_time < end)
+        if venue_ids is not None or artist_ids is not None:
+            query = query.filter(or_(Show.venue_id.in_(sorted(venue_ids)),
+                                     Show.artist_id.in_(sorted(artist_ids))))
+        for id, venue_id, artist_id, start_time, minutes in \
+                query.yield_per(10000):
+            end_at = start_time + dt.timedelta(minutes=minutes)
+            label = 'show %d' % id
+            self.venues.add(venue_id, start_time, end_at, label)
+            self.artists.add(artist_id, start_time, end_at, label)
+        return self
+
+    def conflicts(self, show):
+        '''{field: [errors]} for the bookings show overlaps, or {}'''
+        start, end = show['start_time'], end_time(show)
+        errors = {}
+        for name, index in (('venue_id', self.venues),
+                            ('artist_id', self.artists)):
+            labels = index.overlapping(show[name], start, end)
+            if labels:
+                errors[name] = ['Overlaps %s.' % label for label in labels]
+        return errors
+
+    def book(self, show, label):
+        '''adds show unless it overlaps a booking; returns the conflicts'''
+        errors = self.conflicts(show)
+        if not errors:
+            start, end = show['start_time'], end_time(show)
+            self.venues.add(show['venue_id'], start, end, label)
+            self.artists.add(show['artist_id'], start, end, label)
+        return errors
+
+
+def find_conflicts(session, shows, labels=None):
+    '''{index: errors} of the shows overlapping stored shows or each other
+
+    labels name the shows in the messages, 'show #<index>' by default.
+    '''
+    schedule = Schedule().load(session, shows)
+    labels = labels or ['show #%d' % index for index in range(len(shows))]
+    conflicts = {}
+    for index, show in enumerate(shows):
+        errors = schedule.book(show, labels[index])
+        if errors:
+            conflicts[index] = errors
+    return conflicts
+
+
+def is_overlap_error(error):
+    '''whether a DBAPI error came from the shows exclusion constraints'''
+    return getattr(getattr(error, 'orig', None), 'pgcode', None) == \
+        EXCLUSION_VIOLATION
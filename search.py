@@ -0,0 +1,277 @@
+'''substring search over venue and artist names, and ranked catalog search
+
+On PostgreSQL the ``name`` columns carry pg_trgm GIN indexes, so an
+``ILIKE '%term%'`` is answered from the index and ranked with
+``similarity()``. Other engines (SQLite test databases) fall back to an
+in-process trigram index, rebuilt when a search finds the table's row
+count or latest updated_at changed: writes by other workers and by bulk
+loaders fire no mapper events here.
+
+The catalog search behind /search ranks venues and artists together by
+name, city, state and genres: with ``ts_rank`` over the trigger-maintained
+``search_vector`` GIN indexes on PostgreSQL, and with an in-process
+inverted index elsewhere, kept current the same way.
+'''
+import bisect
+import heapq
+import re
+import threading
+from collections import namedtuple
+from sqlalchemy import event, func, literal, literal_column, select, union_all
+from app import db
+from models import Venue, Artist
+
+
+def ngrams(text, n=3):
+    '''returns the set of n-grams of the lower-cased text'''
+    text = text.lower()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def word_ngrams(text):
+    '''padded trigrams, as pg_trgm extracts them for similarity()'''
+    return ngrams('  ' + text + ' ')
+
+
+def similarity(term, name, term_grams=None):
+    '''trigram similarity in the style of pg_trgm's similarity()'''
+    a = term_grams if term_grams is not None else word_ngrams(term)
+    b = word_ngrams(name)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def escape_like(term):
+    '''escapes LIKE wildcards so the term is matched literally'''
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+Match = namedtuple('Match', 'id name')
+
+
+def table_version(session, model):
+    '''(row count, latest updated_at) of a venue or artist table'''
+    return tuple(session.query(func.count(model.id),
+                               func.max(model.updated_at)).one())
+
+
+class NgramIndex:
+    '''in-memory inverted index from name trigrams to row ids'''
+
+    def __init__(self, rows=()):
+        self.names = {}
+        self.postings = {}
+        for row_id, name in rows:
+            self.add(row_id, name)
+
+    def add(self, row_id, name):
+        self.names[row_id] = name
+        for gram in ngrams(name):
+            self.postings.setdefault(gram, set()).add(row_id)
+
+    def candidates(self, term):
+        '''ids whose names contain every trigram of the term'''
+        grams = ngrams(term)
+        if not grams:
+            return self.names.keys()
+        postings = sorted((self.postings.get(gram, set()) for gram in grams),
+                          key=len)
+        return set.intersection(*postings)
+
+    def search(self, term, limit=None):
+        '''returns (id, name) pairs containing the term, best match first'''
+        needle = term.lower()
+        term_grams = word_ngrams(term)
+        matches = [Match(row_id, self.names[row_id])
+                   for row_id in self.candidates(term)
+                   if needle in self.names[row_id].lower()]
+        matches.sort(key=lambda match: (-similarity(term, match.name,
+                                                    term_grams),
+                                        match.name, match.id))
+        return matches[:limit] if limit else matches
+
+
+class SearchService:
+    '''name search for one model, shared by the HTML views'''
+
+    def __init__(self, model):
+        self.model = model
+        self._index = None
+        self._version = None
+        self._lock = threading.Lock()
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, self.invalidate)
+
+    def invalidate(self, *args):
+        '''drops the in-process index so the next search rebuilds it'''
+        self._index = None
+
+    def index(self, session):
+        version = table_version(session, self.model)
+        with self._lock:
+            if self._index is None or self._version != version:
+                rows = session.query(self.model.id, self.model.name) \
+                    .yield_per(10000)
+                self._index = NgramIndex(rows)
+                self._version = version
+            return self._index
+
+    def search(self, term, limit=None, session=None):
+        '''returns (id, name) rows whose name contains the term
+
+        Runs on db.session unless another session (e.g. the sync side of
+        an AsyncSession) is given.
+        '''
+        if session is None:
+            session = db.session
+        term = term.strip()
+        if session.bind.dialect.name != 'postgresql':
+            return self.index(session).search(term, limit)
+        model = self.model
+        query = session.query(model.id, model.name) \
+            .filter(model.name.ilike('%' + escape_like(term) + '%',
+                                     escape='\\')) \
+            .order_by(func.similarity(model.name, term).desc(),
+                      model.name, model.id)
+        if limit:
+            query = query.limit(limit)
+        return query.all()
+
+
+venue_search = SearchService(Venue)
+artist_search = SearchService(Artist)
+
+
+Hit = namedtuple('Hit', 'kind id name city state score')
+# ts_rank's default weights for the A, B and C labels of search_vector
+WEIGHTS = {"name": 1.0, "place": 0.4, "genres": 0.2}
+
+
+def words(text):
+    '''lower-cased words, split where to_tsvector('simple') splits them'''
+    return re.findall(r'[^\W_]+', text.lower())
+
+
+def prefix_query(term):
+    '''to_tsquery('simple') text matching every word of term as a prefix'''
+    return ' & '.join(word + ':*' for word in words(term))
+
+
+class TextIndex:
+    '''inverted index from words to weighted (kind, id) postings
+
+    Words are kept sorted so that a query word matches every indexed word
+    it is a prefix of, like ``word:*`` in a tsquery.
+    '''
+
+    def __init__(self):
+        self.docs = {}
+        self.postings = {}
+        self._sorted = None
+
+    def add(self, kind, row_id, name, city, state, genres):
+        key = (kind, row_id)
+        self.docs[key] = (name, city, state)
+        fields = ((name, WEIGHTS['name']),
+                  ('%s %s' % (city, state), WEIGHTS['place']),
+                  (' '.join(genres or ()).replace('_', ' '), WEIGHTS['genres']))
+        for text, weight in fields:
+            for word in words(text or ''):
+                posting = self.postings.setdefault(word, {})
+                posting[key] = max(posting.get(key, 0), weight)
+        self._sorted = None
+
+    def expand(self, prefix):
+        '''indexed words starting with prefix'''
+        if self._sorted is None:
+            self._sorted = sorted(self.postings)
+        start = bisect.bisect_left(self._sorted, prefix)
+        for word in self._sorted[start:]:
+            if not word.startswith(prefix):
+                break
+            yield word
+
+    def search(self, term, limit):
+        '''top `limit` Hits matching every word of term, best first
+
+        A document scores the weight of its best field for each word.
+        '''
+        scores = None
+        for prefix in words(term):
+            matched = {}
+            for word in self.expand(prefix):
+                for key, weight in self.postings[word].items():
+                    if weight > matched.get(key, 0):
+                        matched[key] = weight
+            if scores is not None:
+                matched = {key: scores[key] + weight
+                           for key, weight in matched.items()
+                           if key in scores}
+            scores = matched
+            if not scores:
+                return []
+        best = heapq.nsmallest(
+            limit, scores.items(),
+            key=lambda item: (-item[1], self.docs[item[0]][0], item[0]))
+        return [Hit(kind, row_id, *self.docs[(kind, row_id)], score)
+                for (kind, row_id), score in best]
+
+
+class CatalogSearch:
+    '''ranked search over venues and artists together'''
+
+    def __init__(self, models):
+        self.models = models
+        self._index = None
+        self._version = None
+        self._lock = threading.Lock()
+        for model in models.values():
+            for name in ('after_insert', 'after_update', 'after_delete'):
+                event.listen(model, name, self.invalidate)
+
+    def invalidate(self, *args):
+        '''drops the in-process index so the next search rebuilds it'''
+        self._index = None
+
+    def index(self, session):
+        version = [table_version(session, model)
+                   for model in self.models.values()]
+        with self._lock:
+            if self._index is None or self._version != version:
+                index = TextIndex()
+                for kind, model in self.models.items():
+                    rows = session.query(model.id, model.name, model.city,
+                                         model.state, model.genres) \
+                        .yield_per(10000)
+                    for row in rows:
+                        index.add(kind, *row)
+                self._index = index
+                self._version = version
+            return self._index
+
+    def search(self, term, limit=20, session=None):
+        '''the top `limit` venues and artists matching term, as Hits'''
+        if session is None:
+            session = db.session
+        if not words(term):
+            return []
+        if session.bind.dialect.name != 'postgresql':
+            return self.index(session).search(term, limit)
+        query = func.to_tsquery('simple', prefix_query(term))
+        selects = []
+        for kind, model in self.models.items():
+            vector = literal_column(model.__tablename__ + '.search_vector')
+            selects.append(select(
+                literal(kind).label('kind'), model.id, model.name,
+                model.city, model.state,
+                func.ts_rank(vector, query).label('score')
+              ).where(vector.op('@@')(query)))
+        hits = union_all(*selects).subquery()
+        rows = session.execute(
+            select(hits).order_by(hits.c.score.desc(), hits.c.name,
+                                  hits.c.kind, hits.c.id).limit(limit))
+        return [Hit(*row) for row in rows]
+
+
+catalog_search = CatalogSearch({"venue": Venue, "artist": Artist})
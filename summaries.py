@@ -0,0 +1,162 @@
+'''per venue and per artist show counts, maintained incrementally
+
+show_summaries holds, for every venue and artist with shows, the number of
+past and upcoming shows and when the next one starts. Creating a show adds
+it to both summaries; deleting shows recounts the rows they belonged to,
+once per flush however many shows a venue or artist delete cascades to.
+Counts are as of the last rollover, so a show that has started since is
+still counted as upcoming until
+
+    flask rollover-shows
+
+moves it to past. Run it from cron every few minutes; it only recounts the
+rows whose next_show_time has passed. Bulk loaders skip the mapper events
+below and call add_shows() or rebuild() themselves.
+'''
+import datetime as dt
+import click
+from sqlalchemy import and_, case, event, func, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import app, db, page_cache
+from models import (Venue, Artist, Show, ShowSummary, deleted_show_pages,
+                    touch)
+
+KINDS = {
+  "venue": (Venue, Show.venue_id),
+  "artist": (Artist, Show.artist_id)
+}
+CHUNK = 500
+
+
+def add_shows(connection, shows, now=None):
+    '''counts new shows (dicts with venue_id, artist_id and start_time) in'''
+    now = now or dt.datetime.now()
+    deltas = {}
+    for show in shows:
+        upcoming = show['start_time'] > now
+        for kind in KINDS:
+            key = (kind, show[kind + '_id'])
+            delta = deltas.setdefault(key, {
+              "kind": kind, "entity_id": key[1], "past_count": 0,
+              "upcoming_count": 0, "next_show_time": None
+            })
+            if upcoming:
+                delta['upcoming_count'] += 1
+                if delta['next_show_time'] is None or \
+                        show['start_time'] < delta['next_show_time']:
+                    delta['next_show_time'] = show['start_time']
+            else:
+                delta['past_count'] += 1
+    if deltas:
+        connection.execute(upsert(connection), list(deltas.values()))
+
+
+def upsert(connection):
+    '''INSERT ... ON CONFLICT adding the inserted counts to the row'''
+    dialect = postgresql if connection.dialect.name == 'postgresql' \
+        else sqlite
+    table = ShowSummary.__table__
+    insert = dialect.insert(table)
+    new = insert.excluded
+    return insert.on_conflict_do_update(
+        index_elements=['kind', 'entity_id'],
+        set_={
+          "past_count": table.c.past_count + new.past_count,
+          "upcoming_count": table.c.upcoming_count + new.upcoming_count,
+          "next_show_time": case(
+              (table.c.next_show_time.is_(None), new.next_show_time),
+              (and_(new.next_show_time.isnot(None),
+                    new.next_show_time < table.c.next_show_time),
+               new.next_show_time),
+              else_=table.c.next_show_time)
+        })
+
+
+def recount(connection, kind, ids=None, now=None):
+    '''recounts the summaries of the given ids (all of kind when None)'''
+    now = now or dt.datetime.now()
+    model, column = KINDS[kind]
+    table = ShowSummary.__table__
+    counts = select(
+        literal(kind), column,
+        func.count(case((Show.start_time <= now, Show.id))),
+        func.count(case((Show.start_time > now, Show.id))),
+        func.min(case((Show.start_time > now, Show.start_time)))
+      ).group_by(column)
+    delete = table.delete().where(table.c.kind == kind)
+    if ids is not None:
+        counts = counts.where(column.in_(ids))
+        delete = delete.where(table.c.entity_id.in_(ids))
+    connection.execute(delete)
+    connection.execute(table.insert().from_select(
+        ['kind', 'entity_id', 'past_count', 'upcoming_count',
+         'next_show_time'], counts))
+
+
+def rebuild(session, now=None):
+    '''recounts every summary from the shows table'''
+    connection = session.connection()
+    for kind in KINDS:
+        recount(connection, kind, now=now)
+
+
+def rollover(session, now=None):
+    '''recounts the summaries with a show that has started since
+
+    The venues and artists affected are touched, so their pages and the
+    listings revalidate. Returns the number of summaries recounted.
+    '''
+    now = now or dt.datetime.now()
+    connection = session.connection()
+    recounted = 0
+    for kind, (model, column) in KINDS.items():
+        ids = [id for id, in session.query(ShowSummary.entity_id).filter(
+            ShowSummary.kind == kind, ShowSummary.next_show_time <= now)]
+        for start in range(0, len(ids), CHUNK):
+            chunk = ids[start:start + CHUNK]
+            recount(connection, kind, chunk, now)
+            touch(connection, model, chunk)
+        recounted += len(ids)
+    return recounted
+
+
+@event.listens_for(Show, 'after_insert')
+def count_new_show(mapper, connection, show):
+    add_shows(connection, [{"venue_id": show.venue_id,
+                            "artist_id": show.artist_id,
+                            "start_time": show.start_time}])
+
+
+@event.listens_for(Session, 'after_flush')
+def recount_deleted_shows(session, context):
+    '''recounts and touches each venue and artist that lost shows once'''
+    pages = deleted_show_pages(session)
+    if not pages:
+        return
+    connection = session.connection()
+    for kind, (model, column) in KINDS.items():
+        ids = sorted(pages[kind])
+        for start in range(0, len(ids), CHUNK):
+            chunk = ids[start:start + CHUNK]
+            recount(connection, kind, chunk)
+            touch(connection, model, chunk)
+
+
+@app.cli.command('rollover-shows')
+def rollover_command():
+    '''Move shows that have started from upcoming to past counts.'''
+    recounted = rollover(db.session)
+    db.session.commit()
+    if recounted:
+        page_cache.clear()
+    click.echo('%d summaries rolled over' % recounted)
+
+
+@app.cli.command('rebuild-show-summaries')
+def rebuild_command():
+    '''Recount every venue and artist show summary from scratch.'''
+    rebuild(db.session)
+    db.session.commit()
+    page_cache.clear()
+    click.echo('%d summaries rebuilt' % ShowSummary.query.count())
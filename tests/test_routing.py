@@ -0,0 +1,70 @@
+'''GET reads go to the replica, writes and read-your-writes to the primary'''
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, page_cache  # noqa: E402
+from models import Venue, Artist  # noqa: E402
+
+
+@pytest.fixture
+def databases(tmp_path):
+    '''a primary and a replica whose venue 1 names differ'''
+    primary = str(tmp_path / 'primary.db')
+    replica = str(tmp_path / 'replica.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + primary
+    app.config['SQLALCHEMY_REPLICA_URIS'] = []
+    with app.app_context():
+        db.create_all()
+        db.session.add(Venue(name='Primary Hall', city='Oakland', state='CA',
+                             genres=['Jazz'], image_link='',
+                             seeking_description=''))
+        db.session.add(Artist(name='Artist', city='Oakland', state='CA',
+                              genres=['Jazz'], image_link='',
+                              seeking_description=''))
+        db.session.commit()
+        db.session.remove()
+    shutil.copy(primary, replica)
+    with sqlite3.connect(replica) as connection:
+        connection.execute("UPDATE venues SET name = 'Replica Hall'")
+    yield primary, replica
+    app.config['SQLALCHEMY_REPLICA_URIS'] = []
+
+
+def venue_name(client):
+    page_cache.clear()
+    page = client.get('/venues/1').get_data(as_text=True)
+    return [name for name in ('Primary Hall', 'Replica Hall') if name in page]
+
+
+def shows_in(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute('SELECT count(*) FROM shows').fetchone()[0]
+
+
+def test_reads_replica_writes_primary(databases):
+    primary, replica = databases
+    app.config['SQLALCHEMY_REPLICA_URIS'] = ['sqlite:///' + replica]
+    client = app.test_client()
+    assert venue_name(client) == ['Replica Hall']
+
+    response = client.post('/shows/create', data={
+      "venue_id": '1', "artist_id": '1', "start_time": '2031-01-01 20:00:00'
+    })
+    assert response.status_code == 200
+    assert (shows_in(primary), shows_in(replica)) == (1, 0)
+    assert 'read_primary' in response.headers.get('Set-Cookie', '')
+    # the client now carries the read_primary cookie
+    assert venue_name(client) == ['Primary Hall']
+    assert venue_name(app.test_client()) == ['Replica Hall']
+
+
+def test_broken_replica_falls_back_to_primary(databases, tmp_path):
+    app.config['SQLALCHEMY_REPLICA_URIS'] = [
+        'sqlite:///' + str(tmp_path / 'missing' / 'replica.db')]
+    assert venue_name(app.test_client()) == ['Primary Hall']
@@ -0,0 +1,61 @@
+'''/venues issues the same number of statements whatever the venue count'''
+import datetime as dt
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, page_cache  # noqa: E402
+from models import Venue, Artist, Show  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path):
+    app.config['SQLALCHEMY_DATABASE_URI'] = \
+        'sqlite:///' + str(tmp_path / 'venues.db')
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+
+
+def add_venues(count):
+    '''count venues in five cities, each with a past and an upcoming show'''
+    now = dt.datetime.now()
+    artist = Artist(name='Artist', city='San Francisco', state='CA',
+                    genres=['Jazz'], image_link='', seeking_description='')
+    db.session.add(artist)
+    for number in range(count):
+        venue = Venue(name='Venue %d' % number, city='City %d' % (number % 5),
+                      state='CA', genres=['Jazz'], image_link='',
+                      seeking_description='')
+        for days in (-number - 1, number + 1):
+            db.session.add(Show(venue=venue, artist=artist,
+                                start_time=now + dt.timedelta(days=days)))
+    db.session.commit()
+
+
+def statements(client, path):
+    '''the number of statements executed to answer GET path'''
+    executed = []
+
+    def count(*args):
+        executed.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', count)
+    page_cache.clear()
+    try:
+        assert client.get(path).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    return len(executed)
+
+
+def test_venues_statements_do_not_grow_with_venues(client):
+    add_venues(10)
+    few = statements(client, '/venues')
+    assert few > 0
+    add_venues(90)
+    assert statements(client, '/venues') == few